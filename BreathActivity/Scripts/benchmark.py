@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import argparse
+import contextlib
+import io
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import numpy as np
+
+# folder of this script, where plotting.py is
+scriptsPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, scriptsPath)
+
+# the heavy modules that should only be imported when they are used
+DEFERRED_MODULES = ['matplotlib.pyplot', 'scipy.signal', 'scipy.stats', 'pywt']
+
+# the measures of the suite, in the order they run
+MEASURES = ['startup', 'loading', 'hotpaths']
+
+def timed(function, repeat: int = 3):
+    """
+    Run `function` `repeat` times.
+
+    Returns:
+    dict: the best and median wall time in seconds and the number of runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times), 'runs': repeat}
+
+def python_time(code: str, repeat: int = 5):
+    """
+    The wall time of a new Python process running `code` in the scripts folder.
+    """
+    return timed(lambda: subprocess.run([sys.executable, '-c', code], cwd=scriptsPath, check=True), repeat)
+
+def startup_time(repeat: int = 5):
+    """
+    Measure the startup cost of plotting.py: the import of the module and of the modules it defers.
+
+    Returns:
+    dict: the time of each measure (without the interpreter startup), and the deferred modules loaded by the import
+    """
+    interpreter = python_time('pass', repeat)
+    module = python_time('import plotting', repeat)
+    plotting = python_time('import plotting, matplotlib.pyplot, scipy.signal, pywt', repeat)
+
+    check = 'import sys, plotting; print(" ".join(m for m in %r if m in sys.modules))' % DEFERRED_MODULES
+    loaded = subprocess.run([sys.executable, '-c', check], cwd=scriptsPath, check=True, capture_output=True, text=True).stdout.split()
+
+    def without_interpreter(result):
+        return {**result, 'best': result['best'] - interpreter['best'], 'median': result['median'] - interpreter['median']}
+
+    return {
+        'interpreter': interpreter,
+        'import plotting': without_interpreter(module),
+        'import plotting with the plotting modules': without_interpreter(plotting),
+        'heavy modules loaded by the import': loaded
+    }
+
+# ------------------ synthetic cohort -----------------
+
+def synthetic_session(name: str, rng: np.random.Generator, duration: float = 300, pupil_rate: float = 1.0,
+                      rr_interval: float = 5, collected_rate: float = 3.0, responses: int = 40):
+    """
+    A session in the format of the app (the JSON of `StorageData`) with random data for the three levels.
+
+    Parameters:
+    duration (float): Seconds of data in each stage.
+    pupil_rate (float): Pupil sizes per second in the serialData.
+    rr_interval (float): Seconds between two respiratory rates in the serialData.
+    collected_rate (float): Collected samples per second, one in five has a respiratory rate.
+    responses (int): Number of responses in each stage.
+    """
+    data = []
+    for level in ['easy', 'normal', 'hard']:
+        response = []
+        for _ in range(responses):
+            pressed = rng.random() < 0.4
+            reaction = {'pressedSpace': {'reactionTime': float(rng.uniform(0.3, 1.2))}} if pressed else {'doNothing': {}}
+            response.append({'type': {'correct' if rng.random() < 0.8 else 'incorrect': {}}, 'reaction': reaction})
+
+        # a slow drift with blinks (short drops) and noise, a few samples more or less than the duration like the recordings
+        count = int(duration * pupil_rate) + int(rng.integers(-2, 3))
+        seconds = np.arange(count) / pupil_rate
+        pupils = 3 + 0.15 * np.sin(2 * np.pi * seconds / rng.uniform(40, 120)) + 0.05 * rng.standard_normal(count)
+        for start in rng.integers(0, count, max(1, int(duration / 20))):
+            pupils[start:start + max(1, int(0.15 * pupil_rate))] = rng.uniform(0, 1)
+        rates = rng.integers(10, 21, int(duration / rr_interval) + int(rng.integers(-2, 3)))
+        collected = 3 + 0.2 * rng.standard_normal(int(duration * collected_rate))
+
+        data.append({
+            'level': level,
+            'response': response,
+            'collectedData': [
+                {'pupilSize': round(float(pupil), 3), 'respiratoryRate': int(rng.integers(10, 21)) if index % 5 == 0 else None}
+                for index, pupil in enumerate(collected)
+            ],
+            'serialData': {'pupilSizes': [round(float(pupil), 3) for pupil in pupils], 'respiratoryRates': rates.tolist()},
+            'correctRate': sum('correct' in item['type'] for item in response) / max(responses, 1) * 100,
+            'surveyData': {'q1Answer': int(rng.integers(1, 6)), 'q2Answer': int(rng.integers(1, 6))}
+        })
+
+    age = int(rng.integers(20, 60))
+    return {
+        'userData': {'name': name, 'age': str(age), 'gender': str(rng.choice(['Male', 'Female'])), 'levelTried': 'all'},
+        'data': data,
+        'comment': ''
+    }
+
+def synthetic_cohort(folder, participants: int = 20, seed: int = 0, **session_parameters):
+    """
+    Write the session files of a synthetic cohort in `folder`, see `synthetic_session` for the parameters.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    for participant in range(participants):
+        name = f'P{participant:03d}'
+        with open(os.path.join(folder, f'{name}.json'), 'w') as file:
+            json.dump(synthetic_session(name, rng, **session_parameters), file)
+    return folder
+
+# ------------------ measures -----------------
+
+def loading_time(folder, repeat: int = 3):
+    """
+    Compare the loaders of the session files of a folder: json (the loader before the fast path),
+    the fast path (sample lists into arrays, orjson when installed) and the fast path without collectedData.
+    """
+    import plotting
+    filePaths = [os.path.join(folder, filename) for filename in plotting.session_filenames(folder)]
+    loaders = {
+        'json': lambda: [plotting.readJsonFromFile(filePath, fast=False) for filePath in filePaths],
+        'fast': lambda: [plotting.readJsonFromFile(filePath) for filePath in filePaths],
+        'fast without collectedData': lambda: [plotting.readJsonFromFile(filePath, skip=('collectedData',)) for filePath in filePaths]
+    }
+    return {name: timed(loader, repeat) for (name, loader) in loaders.items()}
+
+def hot_paths_time(folder, repeat: int = 3, plots: int = 3):
+    """
+    Time the hot paths of plotting.py on the sessions of a folder, the output files are written in a temporary folder.
+
+    Parameters:
+    plots (int): Number of individual plots drawn in each run of generate_plot.
+    """
+    import plotting
+    filePaths = [os.path.join(folder, filename) for filename in plotting.session_filenames(folder)]
+    load = lambda: [plotting.readJsonFromFile(filePath, skip=('collectedData',)) for filePath in filePaths]
+
+    raw = load()
+    stages = [stage for storageData in raw for stage in storageData.data]
+    serialDatas = [stage.serialData for stage in stages]
+
+    configured = load()
+    plotting.configure_storagesData(configured)
+    pupils = [stage.serialData.pupilSizes for storageData in configured for stage in storageData.data]
+    grand_average_pupil = plotting.grand_average_signal(plotting.ExperimentDataType.PUPIL, configured)
+    grand_average_rr = plotting.grand_average_signal(plotting.ExperimentDataType.RR, configured)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output, contextlib.redirect_stdout(io.StringIO()):
+        # the plots are drawn without a display like in the worker processes
+        plotting._init_render_worker(output, plotting.PREPROCESSING)
+
+        measures = {
+            'readJsonFromFile': load,
+            'StageQuality': lambda: plotting.StageQuality(serialDatas),
+            'interpolated_blinks': lambda: plotting.interpolated_blinks([serialData.pupilSizes for serialData in serialDatas]),
+            'configured': lambda: [plotting.configured_serialData(serialData) for serialData in serialDatas],
+            'configured_batch': lambda: plotting.configured_batch(serialDatas),
+            'normalized_outliers': lambda: [plotting.normalized_outliers(serialData.pupilSizes) for serialData in serialDatas],
+            'compute_ipa': lambda: [plotting.compute_ipa(pupil) for pupil in pupils],
+            'compute_windowed_ipa': lambda: plotting.compute_windowed_ipa(pupils, window=5),
+            # the default interval is shorter than the filter window and returns nothing
+            'compute_ripa': lambda: [plotting.compute_ripa(pupil, interval_length=30) for pupil in pupils],
+            'compute_lhipa': lambda: [plotting.compute_lhipa(pupil) for pupil in pupils],
+            'grand_average_signal': lambda: [
+                plotting.grand_average_signal(type, configured) for type in (plotting.ExperimentDataType.PUPIL, plotting.ExperimentDataType.RR)
+            ],
+            'analyze_median': lambda: plotting.analyze_median(raw),
+            'generate_plot': lambda: [
+                plotting.generate_plot(storageData, grand_average_pupil, grand_average_rr) for storageData in configured[:plots]
+            ]
+        }
+        for (name, function) in measures.items():
+            results[name] = timed(function, repeat)
+
+    counts = {'sessions': len(raw), 'stages': len(stages), 'plots': min(plots, len(configured))}
+    return results, counts
+
+# ------------------ results -----------------
+
+def environment():
+    import plotting
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'orjson': plotting.orjson is not None,
+        'preprocessing': plotting.preprocessing_parameters()
+    }
+
+def compare(results: dict, previous: dict):
+    """
+    Print the best time of each measure next to the one of a previous run, with the speedup.
+    """
+    print(f'🙆🏻 compared with the run of {previous.get("started", "unknown")}')
+    for (measure, values) in results['measures'].items():
+        for (name, value) in values.items():
+            before = previous.get('measures', {}).get(measure, {}).get(name)
+            if not isinstance(value, dict) or not isinstance(before, dict): continue
+            speedup = before['best'] / value['best'] if value['best'] > 0 else float('nan')
+            print(f'{measure} / {name}: {value["best"] * 1000:.1f} ms, was {before["best"] * 1000:.1f} ms ({speedup:.2f}x)')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the performance of plotting.py on a synthetic cohort.')
+    parser.add_argument('measures', nargs='*', default=MEASURES, help=f'measures to run ({", ".join(MEASURES)})')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each measure, the best one is compared')
+    parser.add_argument('--participants', type=int, default=20, help='participants of the synthetic cohort')
+    parser.add_argument('--duration', type=float, default=300, help='seconds of data in each stage of the synthetic cohort')
+    parser.add_argument('--pupil-rate', type=float, default=1.0, help='pupil sizes per second in the synthetic cohort')
+    parser.add_argument('--rr-interval', type=float, default=5, help='seconds between two respiratory rates in the synthetic cohort')
+    parser.add_argument('--collected-rate', type=float, default=3.0, help='collected samples per second in the synthetic cohort')
+    parser.add_argument('--responses', type=int, default=40, help='responses in each stage of the synthetic cohort')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic cohort')
+    parser.add_argument('--plots', type=int, default=3, help='individual plots drawn in each run of generate_plot')
+    parser.add_argument('--output', help='file of the JSON results (default: benchmark-<date>.json in the current folder)')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    arguments = parser.parse_args()
+
+    for measure in arguments.measures:
+        if measure not in MEASURES: parser.error(f'unknown measure {measure}, choose from {", ".join(MEASURES)}')
+
+    cohort = {
+        'participants': arguments.participants,
+        'duration': arguments.duration,
+        'pupil_rate': arguments.pupil_rate,
+        'rr_interval': arguments.rr_interval,
+        'collected_rate': arguments.collected_rate,
+        'responses': arguments.responses,
+        'seed': arguments.seed
+    }
+    results = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'cohort': cohort,
+        'repeat': arguments.repeat,
+        'measures': {}
+    }
+
+    if 'startup' in arguments.measures:
+        print('🙆🏻 measuring the startup time')
+        results['measures']['startup'] = startup_time(arguments.repeat)
+        for (name, value) in results['measures']['startup'].items():
+            if isinstance(value, list):
+                print(f'{name}: {", ".join(value) or "none"}')
+            else:
+                print(f'{name}: {value["best"] * 1000:.1f} ms')
+
+    if 'loading' in arguments.measures or 'hotpaths' in arguments.measures:
+        with tempfile.TemporaryDirectory() as folder:
+            print(f'🙆🏻 making a synthetic cohort of {arguments.participants} participants')
+            synthetic_cohort(
+                folder, arguments.participants, arguments.seed, duration=arguments.duration, pupil_rate=arguments.pupil_rate,
+                rr_interval=arguments.rr_interval, collected_rate=arguments.collected_rate, responses=arguments.responses
+            )
+            cohort['megabytes'] = sum(os.path.getsize(os.path.join(folder, filename)) for filename in os.listdir(folder)) / 1e6
+
+            if 'loading' in arguments.measures:
+                print(f'🙆🏻 measuring the loading time of {cohort["megabytes"]:.1f} MB of session files')
+                times = results['measures']['loading'] = loading_time(folder, arguments.repeat)
+                for (name, value) in times.items():
+                    print(f'{name}: {value["best"] * 1000:.1f} ms ({times["json"]["best"] / value["best"]:.1f}x)')
+
+            if 'hotpaths' in arguments.measures:
+                print('🙆🏻 measuring the hot paths')
+                (times, counts) = hot_paths_time(folder, arguments.repeat, arguments.plots)
+                results['measures']['hotpaths'] = times
+                cohort.update(counts)
+                for (name, value) in times.items():
+                    print(f'{name}: {value["best"] * 1000:.1f} ms (median {value["median"] * 1000:.1f} ms)')
+
+    output = arguments.output or f'benchmark-{time.strftime("%Y%m%d-%H%M%S")}.json'
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'🙆🏻 results saved at {output}')
+
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            compare(results, json.load(file))
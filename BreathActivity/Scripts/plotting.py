@@ -1,20 +1,108 @@
 import os
 import json
-from dataclasses import dataclass, field
-from typing import List
+import argparse
+import errno
+import hashlib
+import heapq
+import re
 import sys
-import matplotlib.pyplot as plt
-from scipy.signal import resample
-from scipy.stats import median_abs_deviation
-from functools import reduce
-import math, pywt, numpy as np
-from scipy.signal import savgol_filter
-import numpy as np
+import warnings
+import cProfile
+import pstats
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field, asdict, replace
+from contextlib import contextmanager
+from functools import cached_property
+from typing import List
+import time
+import math, numpy as np
+try:
+    # faster decoding of the session files, the json module is used without it
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    # peak memory of the run report, not available on Windows
+    import resource
+except ImportError:
+    resource = None
+# matplotlib, scipy and pywt take most of the import time, they are imported in the functions using them
+# (pyplot only to draw the plots, pywt only for the IPA and LHIPA)
 from enum import Enum
 import csv
 
 # parameters
-folderPath = sys.argv[1]
+# the study folder, the outputs are written in it (set from the command line or by `Pipeline`)
+folderPath = None
+
+# the grand average respiratory rate drawn in the individual plots can move this much (breaths per minute, about a pixel)
+# before the plots made with an older grand average are regenerated in the incremental mode
+OVERLAY_TOLERANCE = 0.05
+
+# preprocessing parameters
+MAD_THRESHOLD = 2.5     # moderately conservative
+
+@dataclass(frozen=True)
+class Preprocessing:
+    """
+    Time base of the configured stages: a stage lasts `duration` seconds and its signals are brought to the target rates
+    (samples per second) whatever rate they were recorded at. The sessions have no timestamps, the recorded rate of a signal 
+    is its number of samples over the duration of the stage, and the configured samples are at `index / rate` seconds.
+    """
+    duration: float = 300.0         # 5 minutes of data for each stage
+    pupilRate: float = 1.0          # one pupil size every second
+    respiratoryRate: float = 0.2    # one respiratory rate every 5 seconds
+    madThreshold: float = MAD_THRESHOLD
+    smoothing: float = 60.0         # seconds of pupil size in the smoothing window of the plots
+    ipaWindow: float = 5.0          # seconds of pupil size for each IPA value
+    decimateAbove: float = 4.0      # pupil sizes recorded this many times faster than pupilRate are decimated first
+    # screening of the raw stages before they are configured (see `StageQuality`), the defaults only drop the constant ones
+    maxConstantRun: float = 1.0     # stages with a run of the same value this long (fraction of the signal) are dropped
+    maxDropout: float = 1.0         # largest fraction of missing (NaN) or zero pupil sizes, i.e. blinks and tracker dropouts
+    maxClipped: float = 1.0         # largest fraction of pupil sizes outside the MAD bounds
+    minLength: float = 0.0          # smallest number of samples, as a fraction of the median number of samples of the stages
+    # blinks and tracker dropouts of the raw pupil sizes (see `interpolated_blinks`)
+    blinkFill: str = 'linear'       # how the gaps are filled: 'linear', 'cubic' or 'none' to keep the raw pupil sizes
+    blinkSpeed: float = 16.0        # dilation speeds more than this many MADs above the median are blinks
+    blinkPadding: float = 0.05      # seconds of pupil sizes dropped on both sides of a gap
+    
+    @property
+    def pupilPoints(self):
+        return round(self.duration * self.pupilRate)
+    
+    @property
+    def rrPoints(self):
+        return round(self.duration * self.respiratoryRate)
+    
+    @property
+    def pupilInterval(self):
+        return 1 / self.pupilRate
+    
+    @property
+    def rrInterval(self):
+        return 1 / self.respiratoryRate
+    
+    def pupil_times(self, count: int):
+        return np.arange(count) * self.pupilInterval
+    
+    def rr_times(self, count: int):
+        return np.arange(count) * self.rrInterval
+    
+    # the number of configured pupil sizes in some seconds
+    def pupil_samples(self, seconds: float):
+        return max(1, round(seconds * self.pupilRate))
+
+PREPROCESSING = Preprocessing()
+
+# number of processes drawing the individual plots (None is the number of CPUs, 1 draws them in this process)
+PLOT_WORKERS = None
+
+# number of samples of the padded arrays of a batch of stages, larger cohorts are configured in several batches so the memory stays bounded
+BATCH_SAMPLES = 2 ** 20
+
+# how many times faster than real time the sessions are replayed with --replay
+REPLAY_SPEED = 60
 
 # Define Enums
 class ReactionType:
@@ -30,10 +118,57 @@ class CollectedData:
     pupilSize: float
     respiratoryRate: int | None
 
+# columnar view of the collected samples of a stage, one contiguous array per field
+class CollectedDataColumns:
+    __slots__ = ('pupilSizes', 'respiratoryRates', 'hasRespiratoryRate')
+    
+    def __init__(self, pupilSizes = (), respiratoryRates = (), hasRespiratoryRate = None):
+        self.pupilSizes = np.ascontiguousarray(pupilSizes, dtype=np.float32)
+        self.respiratoryRates = np.ascontiguousarray(respiratoryRates, dtype=np.uint8)
+        # respiratory rate is optional for each sample, the mask tells which ones were recorded
+        if hasRespiratoryRate is None:
+            hasRespiratoryRate = np.ones(len(self.respiratoryRates), dtype=bool)
+        self.hasRespiratoryRate = np.ascontiguousarray(hasRespiratoryRate, dtype=bool)
+    
+    @classmethod
+    def from_records(cls, records: list[dict]):
+        count = len(records)
+        pupilSizes = np.fromiter((record['pupilSize'] for record in records), dtype=np.float32, count=count)
+        rates = [record.get('respiratoryRate') for record in records]
+        hasRespiratoryRate = np.fromiter((rate is not None for rate in rates), dtype=bool, count=count)
+        respiratoryRates = np.fromiter((rate or 0 for rate in rates), dtype=np.uint8, count=count)
+        return cls(pupilSizes, respiratoryRates, hasRespiratoryRate)
+    
+    def __len__(self):
+        return len(self.pupilSizes)
+    
+    def __getitem__(self, index):
+        # slicing returns a view on the same arrays, an integer returns a single CollectedData sample
+        if isinstance(index, slice):
+            return CollectedDataColumns(
+                self.pupilSizes[index], 
+                self.respiratoryRates[index], 
+                self.hasRespiratoryRate[index]
+            )
+        rate = int(self.respiratoryRates[index]) if self.hasRespiratoryRate[index] else None
+        return CollectedData(float(self.pupilSizes[index]), rate)
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
 @dataclass
 class SerialData:
-    pupilSizes: list[float] = field(default_factory=list) 
-    respiratoryRates: list[int] = field(default_factory=list) 
+    pupilSizes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+    respiratoryRates: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint8))
+    
+    def __post_init__(self):
+        # raw samples from JSON are stored the same way the app records them: Float pupil sizes and UInt8 respiratory rates
+        # arrays (e.g. the configured data) are kept as they are
+        if not isinstance(self.pupilSizes, np.ndarray):
+            self.pupilSizes = np.ascontiguousarray(self.pupilSizes, dtype=np.float32)
+        if not isinstance(self.respiratoryRates, np.ndarray):
+            self.respiratoryRates = np.ascontiguousarray(self.respiratoryRates, dtype=np.uint8)
 
 @dataclass
 class Response:
@@ -56,10 +191,14 @@ class SurveyData:
 class ExperimentalData:
     level: str
     response: List[Response]
-    collectedData: List[CollectedData]
-    serialData: SerialData = SerialData()
+    collectedData: CollectedDataColumns
+    serialData: SerialData = field(default_factory=SerialData)
     correctRate: float | None = None
     surveyData: SurveyData | None = None
+    # configured serialData computed ahead of time (e.g. loaded from the cache), used by `configured`
+    configuredData: SerialData | None = field(default=None, init=False, repr=False, compare=False)
+    # data-quality metrics of the raw serialData (e.g. loaded from the cache), see `StageQuality`
+    quality: dict | None = field(default=None, init=False, repr=False, compare=False)
     
     def level_as_number(self):
         if self.level == 'easy':
@@ -81,22 +220,19 @@ class ExperimentalData:
         else:
             return 'unknown'
     
+    # behavioural metrics of the stage, decoded from the responses the first time they are needed
+    @cached_property
+    def metrics(self):
+        return StageMetrics(self.response)
+    
     def mean_reaction_time(self):
         # calculate the mean reaction time
-        reactionTimes = []
-        for response in self.response:
-            if 'pressedSpace' in response.reaction and 'correct' in response.type:
-                reactionTimes.append(response.reaction['pressedSpace']['reactionTime'])
-        return np.mean(reactionTimes)
+        return self.metrics.meanReactionTime
     
     # number of error in the task made by the user
     def number_of_error(self):
         # calculate the number of error
-        error = 0
-        for response in self.response:
-            if 'pressedSpace' in response.reaction and 'incorrect' in response.type:
-                error += 1
-        return error
+        return self.metrics.errors
     
     def omission(self):
         """
@@ -104,40 +240,74 @@ class ExperimentalData:
         Omission is when the user should have pressed the space bar but did not (When there is a targeted image appear).
         """
         # calculate the omission rate
-        omission = 0
-        for response in self.response:
-            if 'doNothing' in response.reaction and 'incorrect' in response.type:
-                omission += 1
-        return omission
+        return self.metrics.omissions
     
     # accuracy rate from the task (from both directly pressed and indirectly passed)
     def accuracy(self):
-        # number of reaction as pressedSpace and have correct response
-        total_correct = 0
-        for response in self.response:
-            if 'correct' in response.type:
-                total_correct += 1
-        # calculate the accuracy
-        return (total_correct / len(self.response)) * 100
+        return self.metrics.accuracy
+
+class StageMetrics:
+    """
+    Behavioural metrics of a stage. The responses are decoded once into arrays 
+    (reaction kind, correctness and reaction time of each response) and every metric is computed from them at once.
+    """
+    # reaction kinds
+    DO_NOTHING = 0
+    PRESSED_SPACE = 1
+    OTHER = 2
+    
+    # correctness
+    INCORRECT = 0
+    CORRECT = 1
+    UNKNOWN = -1
+    
+    def __init__(self, responses: List[Response]):
+        count = len(responses)
+        self.reactionKind = np.full(count, StageMetrics.OTHER, dtype=np.uint8)
+        self.correctness = np.full(count, StageMetrics.UNKNOWN, dtype=np.int8)
+        self.reactionTime = np.full(count, np.nan)
+        
+        for index, response in enumerate(responses):
+            if 'pressedSpace' in response.reaction:
+                self.reactionKind[index] = StageMetrics.PRESSED_SPACE
+                self.reactionTime[index] = response.reaction['pressedSpace']['reactionTime']
+            elif 'doNothing' in response.reaction:
+                self.reactionKind[index] = StageMetrics.DO_NOTHING
+            
+            if 'correct' in response.type: self.correctness[index] = StageMetrics.CORRECT
+            elif 'incorrect' in response.type: self.correctness[index] = StageMetrics.INCORRECT
+        
+        pressed = self.reactionKind == StageMetrics.PRESSED_SPACE
+        correct = self.correctness == StageMetrics.CORRECT
+        incorrect = self.correctness == StageMetrics.INCORRECT
+        
+        # mean reaction time of the correct presses
+        correctReactionTimes = self.reactionTime[pressed & correct]
+        self.meanReactionTime = correctReactionTimes.mean() if len(correctReactionTimes) > 0 else np.nan
+        
+        # pressed the space bar when it should not
+        self.errors = int(np.count_nonzero(pressed & incorrect))
+        
+        # did not press the space bar when it should
+        self.omissions = int(np.count_nonzero((self.reactionKind == StageMetrics.DO_NOTHING) & incorrect))
+        
+        # accuracy from both directly pressed and indirectly passed responses
+        self.correct = int(np.count_nonzero(correct))
+        self.accuracy = (self.correct / count) * 100 if count > 0 else np.nan
 
 @dataclass
 class StorageData:
     userData: UserData
     data: List[ExperimentalData]
     comment: str
+    # the session file the data was loaded from
+    filePath: str | None = field(default=None, repr=False, compare=False)
 
-def readJsonFilesFromFolder(path):
-    storageDataList: StorageData | None = []
+def readJsonFilesFromFolder(path, workers: int | None = None, cacheDir: str | None = None, skip = ()):
     try:
-        # Iterate through each file in the folder
-        for filename in os.listdir(path):
-            filePath = os.path.join(path, filename)
-            
-            # Check if the file is a JSON file
-            if filename.endswith('.json'):
-                storageData = readJsonFromFile(filePath)
-                storageDataList.append(storageData)
-
+        storageDataList = list(streamJsonFilesFromFolder(path, workers=workers, cacheDir=cacheDir, skip=skip))
+        # the sessions come in completion order, keep the outputs in the order of the files
+        storageDataList.sort(key=lambda storageData: storageData.filePath or '')
         return storageDataList
 
     except OSError as e:
@@ -147,16 +317,153 @@ def readJsonFilesFromFolder(path):
         print("Error decoding JSON data:", e)
         return None
 
-def readJsonFromFile(filePath):
-    with open(filePath, 'r') as file:
+# the session files of a folder, hidden files (like the incremental manifest) are not sessions
+def session_filenames(path):
+    return [
+        filename for filename in sorted(os.listdir(path))
+        if filename.endswith('.json') and not filename.startswith('.')
+    ]
+
+def streamJsonFilesFromFolder(path, workers: int | None = None, prefetch: int | None = None, cacheDir: str | None = None, skip = ()):
+    """
+    Parse the JSON files of a folder in a process pool and yield each StorageData as soon as it is ready.
+    
+    Parameters:
+    path (str): The folder that contains the session JSON files.
+    workers (int): Number of parsing processes (default is the number of CPUs). With 1 worker the files are parsed in this process.
+    prefetch (int): Maximum number of files being parsed or waiting to be consumed (default is twice the number of workers).
+    cacheDir (str): Folder of the sessions cache (default is no cache), see `loadStorageData`.
+    skip (tuple): The fields of the stages which are not needed, see `loadStorageData`.
+    
+    Returns:
+    A generator of StorageData in completion order, so the caller can work on one session while the next ones are parsed.
+    With the cache, the sessions are always mapped in this process: the cache hits are not sent to the workers, 
+    which only parse the cache misses and write their entries (a mapped session sent back by a worker would be copied).
+    """
+    filePaths = [os.path.join(path, filename) for filename in session_filenames(path)]
+    
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for filePath in filePaths:
+            yield loadStorageData(filePath, cacheDir, skip)
+        return
+    
+    if cacheDir is not None:
+        misses = []
+        for filePath in filePaths:
+            storageData = readCache(cache_path(cacheDir, filePath), cache_key(filePath), skip)
+            if storageData is not None: yield storageData
+            else: misses.append(filePath)
+        filePaths = misses
+        if not filePaths: return
+    
+    prefetch = max(prefetch or 2 * workers, 1)
+    pending = {}
+    remaining = iter(filePaths)
+    
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_load_worker, initargs=(PREPROCESSING,))
+    try:
+        while True:
+            # keep at most `prefetch` files in flight so parsed sessions do not pile up in memory
+            for filePath in remaining:
+                if cacheDir is None:
+                    pending[executor.submit(readJsonFromFile, filePath, skip)] = filePath
+                else:
+                    pending[executor.submit(_load_cache_miss, filePath, cacheDir)] = filePath
+                if len(pending) >= prefetch: break
+            
+            if not pending: break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filePath = pending.pop(future)
+                storageData = future.result()
+                if storageData is None:
+                    # the worker wrote the cache entry, map it here
+                    storageData = readCache(cache_path(cacheDir, filePath), cache_key(filePath), skip) or loadStorageData(filePath, cacheDir, skip)
+                yield storageData
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _load_cache_miss(filePath, cacheDir):
+    # parse a session missing from the cache in a worker, it is only sent back when its entry could not be written
+    (storageData, written) = parseToCache(filePath, cache_path(cacheDir, filePath), cache_key(filePath))
+    return None if written else storageData
+
+def _init_load_worker(preprocessing):
+    global PREPROCESSING
+    PREPROCESSING = preprocessing
+
+# the sample lists of a session file, they only hold numbers (objects of numbers for collectedData)
+SAMPLE_LISTS = re.compile(rb'"(pupilSizes|respiratoryRates|collectedData)"\s*:\s*\[([^\]]*)\]')
+
+# the type the app records each sample list with
+SAMPLE_TYPES = {'pupilSizes': np.float32, 'respiratoryRates': np.uint8}
+
+def decodeSessionJson(content: bytes, skip = ()):
+    """
+    Decode a session file with its sample lists decoded straight into NumPy arrays.
+    
+    The number lists of serialData are cut out of the file and parsed by NumPy, the rest of the document is decoded
+    by orjson (json when it is not installed). The lists of the fields in `skip` (e.g. collectedData) are left out without being decoded.
+    
+    Returns:
+    dict: the session like `json.loads` gives it, with arrays instead of the serialData lists.
+    """
+    arrays = []
+    
+    def cut(match):
+        name = match.group(1).decode()
+        if name in skip: return b'"%s":[]' % match.group(1)
+        if name not in SAMPLE_TYPES: return match.group(0)
+        
+        body = match.group(2)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                values = np.fromstring(body, dtype=np.float64, sep=',')
+        except (ValueError, DeprecationWarning):
+            # a list NumPy can't read is decoded with the rest of the document
+            return match.group(0)
+        if len(values) != (body.count(b',') + 1 if body.strip() else 0): return match.group(0)
+        
+        arrays.append(values.astype(SAMPLE_TYPES[name]))
+        return b'"%s":{"array":%d}' % (match.group(1), len(arrays) - 1)
+    
+    content = SAMPLE_LISTS.sub(cut, content)
+    jsonData = orjson.loads(content) if orjson is not None else json.loads(content)
+    
+    for experimentalData in jsonData['data']:
+        serialData = experimentalData.get('serialData', {})
+        for name in SAMPLE_TYPES:
+            if isinstance(serialData.get(name), dict): serialData[name] = arrays[serialData[name]['array']]
+    
+    return jsonData
+
+def readJsonFromFile(filePath, skip = (), fast: bool = True):
+    """
+    Parse a session file.
+    
+    Parameters:
+    filePath (str): The session JSON file.
+    skip (tuple): The fields of the stages which are not needed (e.g. ('collectedData',)), they are left empty.
+    fast (bool): Decode the sample lists into arrays and use orjson when it is installed (see `decodeSessionJson`),
+    otherwise the whole file is decoded by json.
+    """
+    with open(filePath, 'rb') as file:
         # Parse JSON data
-        jsonData = json.load(file)
+        if fast:
+            jsonData = decodeSessionJson(file.read(), skip)
+        else:
+            jsonData = json.load(file)
+            for experimentalData in jsonData['data']:
+                for name in skip: experimentalData[name] = []
                 
         # Extract data from JSON and create instances of ExperimentalData
         experimentalDataList = []
         for experimentalData in jsonData['data']:
             responses = [Response(**response) for response in experimentalData['response']]
-            collectedData = [CollectedData(**data) for data in experimentalData['collectedData']]
+            collectedData = CollectedDataColumns.from_records(experimentalData['collectedData'])
             experimental_data = ExperimentalData(
                 level = experimentalData['level'],
                 response = responses,
@@ -174,23 +481,311 @@ def readJsonFromFile(filePath):
         return StorageData(
             userData = userData,
             data = experimentalDataList,
-            comment = jsonData['comment']
+            comment = jsonData['comment'],
+            filePath = filePath
         )
 
-# normalize a list based on upper and lower bounds
-def normalized(value, upper, lower, replacement = None):
-    if value > upper: return upper
-    elif value < lower: return lower
-    else: return replacement if replacement else value
+def preprocessing_parameters():
+    return asdict(PREPROCESSING)
+
+# the cache entry of a session is only valid for the same file content and preprocessing parameters
+def cache_key(filePath):
+    stat = os.stat(filePath)
+    source = {
+        'path': os.path.abspath(filePath),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'parameters': preprocessing_parameters()
+    }
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()
+
+# one cache folder per source file, so a changed session overwrites its old entry
+def cache_path(cacheDir, filePath):
+    name = hashlib.sha1(os.path.abspath(filePath).encode()).hexdigest()
+    return os.path.join(cacheDir, name)
+
+def loadStorageData(filePath, cacheDir: str | None = None, skip = ()):
+    """
+    Load a session, using the on-disk cache when it is up to date.
+    
+    Parameters:
+    filePath (str): The session JSON file.
+    cacheDir (str): Folder of the cache (default is None, which parses the JSON file without caching).
+    skip (tuple): The fields of the stages which are not needed (e.g. ('collectedData',)), the cache always keeps the whole sessions.
+    
+    Returns:
+    StorageData with the raw serialData of each stage, and with the cache the quality and configured data saved by an earlier run (see `updateCache`). 
+    With the cache, the samples of the session are memory-mapped from its sample file (see `writeCache`),
+    they are only read from the disk when they are used and a slice of them is not copied.
+    """
+    if cacheDir is None: return readJsonFromFile(filePath, skip)
+    
+    key = cache_key(filePath)
+    entry = cache_path(cacheDir, filePath)
+    
+    storageData = readCache(entry, key, skip)
+    if storageData is not None: return storageData
+    
+    (storageData, written) = parseToCache(filePath, entry, key)
+    if not written: return storageData
+    
+    # use the mapped samples from now on, the parsed ones are released
+    return readCache(entry, key, skip) or storageData
+
+def parseToCache(filePath, entry, key):
+    """
+    Parse a session and write its cache entry, with the raw samples only (the stages are configured by the configure step).
+    
+    Returns:
+    (StorageData, bool): the parsed session and whether its cache entry was written
+    """
+    storageData = readJsonFromFile(filePath)
+    try:
+        writeCache(entry, key, storageData)
+    except OSError as e:
+        print("Error writing cache file:", e)
+        return (storageData, False)
+    return (storageData, True)
+
+def writeCache(entry, key, storageData: StorageData):
+    """
+    Save a session as a sample store: a folder with a small JSON header (`meta.json`) and one sample file 
+    with all the raw time series of all the stages (`samples.bin`, their offsets are in the header), which `readCache` maps into memory.
+    The quality and configured data of the stages are added later, see `updateCache`.
+    """
+    os.makedirs(entry, exist_ok=True)
+    
+    # the header is written last, an entry that is only partly written is never read
+    header = os.path.join(entry, 'meta.json')
+    if os.path.exists(header): os.remove(header)
+    
+    series = [
+        {
+            'pupilSizes': stage.serialData.pupilSizes,
+            'respiratoryRates': stage.serialData.respiratoryRates,
+            'collectedPupilSizes': stage.collectedData.pupilSizes,
+            'collectedRespiratoryRates': stage.collectedData.respiratoryRates,
+            'hasRespiratoryRate': stage.collectedData.hasRespiratoryRate
+        }
+        for stage in storageData.data
+    ]
+    layout = writeSamples(os.path.join(entry, 'samples.bin'), series)
+    
+    stages = []
+    for (stage, positions) in zip(storageData.data, layout):
+        stages.append({
+            'level': stage.level,
+            'response': [asdict(response) for response in stage.response],
+            'correctRate': stage.correctRate,
+            'surveyData': asdict(stage.surveyData) if stage.surveyData else None,
+            'series': positions,
+            'configured': None,
+            'quality': None
+        })
+    
+    meta = {
+        'key': key,
+        'userData': asdict(storageData.userData),
+        'comment': storageData.comment,
+        'filePath': storageData.filePath,
+        'stages': stages
+    }
+    writeHeader(header, meta)
+    
+    # the series files of the entries written before the sample file, and the configured data of the old entry
+    for filename in os.listdir(entry):
+        if filename.endswith('.npy') or filename == 'configured.bin':
+            try:
+                os.remove(os.path.join(entry, filename))
+            except OSError:
+                pass
+
+def updateCache(entry, key, stages: List[ExperimentalData]):
+    """
+    Add what the configure step computed for the stages of a session to its cache entry: 
+    the quality metrics of the stages in the header and their configured data in a second sample file (`configured.bin`).
+    
+    Parameters:
+    stages (list): every stage of the session, in the order of the session file (the ones dropped by the screening have no configured data).
+    
+    Returns:
+    bool: whether the entry was updated (not when it was written again for another version of the session meanwhile)
+    """
+    header = os.path.join(entry, 'meta.json')
+    with open(header, 'r') as file:
+        meta = json.load(file)
+    if meta['key'] != key or len(meta['stages']) != len(stages): return False
+    
+    configured = [(stageMeta, stage.configuredData) for (stageMeta, stage) in zip(meta['stages'], stages) if stage.configuredData is not None]
+    layout = writeSamples(os.path.join(entry, 'configured.bin'), [
+        {'pupilSizes': configuredData.pupilSizes, 'respiratoryRates': configuredData.respiratoryRates} 
+        for (_, configuredData) in configured
+    ])
+    for (stageMeta, stage) in zip(meta['stages'], stages):
+        stageMeta['configured'] = None
+        stageMeta['quality'] = stage.quality
+    for ((stageMeta, _), positions) in zip(configured, layout): stageMeta['configured'] = positions
+    writeHeader(header, meta)
+    return True
+
+def writeHeader(header, meta):
+    temporary = f'{header}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(meta, file)
+    os.replace(temporary, header)
+
+# the series of a sample file start at a multiple of this many bytes, so their views are aligned
+SAMPLE_ALIGNMENT = 16
+
+def writeSamples(path, series: list[dict]):
+    """
+    Write the time series of the stages of a session one after the other in one file.
+    The file is replaced at once, the processes that mapped the old file keep reading it.
+    
+    Returns:
+    list[dict]: the position of each series of each stage in the file ([offset, dtype, count])
+    """
+    temporary = f'{path}.{os.getpid()}.tmp'
+    layout = []
+    offset = 0
+    with open(temporary, 'wb') as file:
+        for stageSeries in series:
+            positions = {}
+            for (name, values) in stageSeries.items():
+                values = np.ascontiguousarray(values)
+                padding = -offset % SAMPLE_ALIGNMENT
+                file.write(bytes(padding))
+                offset += padding
+                positions[name] = [offset, values.dtype.str, len(values)]
+                file.write(values.data)
+                offset += values.nbytes
+            layout.append(positions)
+    os.replace(temporary, path)
+    return layout
+
+# running out of files or memory is not a missing cache entry, the session would be parsed again on every run
+RESOURCE_ERRORS = (errno.EMFILE, errno.ENFILE, errno.ENOMEM)
+
+def raise_open_files_limit():
+    # each mapped session keeps a file open, raise the soft limit of open files to the hard one (True when it was raised)
+    if resource is None: return False
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # an unlimited hard limit is refused on macOS, which allows at most 10240 open files by default
+    target = hard if hard != resource.RLIM_INFINITY else 10240
+    if soft == resource.RLIM_INFINITY or target <= soft: return False
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        return True
+    except (ValueError, OSError):
+        return False
+
+# sample files mapped by this process, each mapping keeps a file open until it is released
+_mappedSamples = 0
+
+def can_map_samples():
+    # keep a quarter of the open files (at least 32) for the rest of the program, raising the limit once it is reached
+    if resource is None: return True
+    (soft, _) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or _mappedSamples + max(soft // 4, 32) < soft: return True
+    return raise_open_files_limit() and can_map_samples()
+
+def readSamples(path):
+    """
+    Map the sample file of a cache entry, one open file for the whole session.
+    When no more files can be kept open (even with a raised limit of open files) the file is read into memory instead.
+    """
+    global _mappedSamples
+    if os.path.getsize(path) == 0: return np.empty(0, dtype=np.uint8)
+    if can_map_samples():
+        try:
+            samples = np.memmap(path, dtype=np.uint8, mode='r')
+            _mappedSamples += 1
+            return samples
+        except OSError as e:
+            if e.errno not in RESOURCE_ERRORS: raise
+    return np.fromfile(path, dtype=np.uint8)
+
+def sampleSeries(samples: np.ndarray, position):
+    # a view of one series of a sample file, see `writeSamples`
+    (offset, dtype, count) = position
+    dtype = np.dtype(dtype)
+    return samples[offset:offset + count * dtype.itemsize].view(dtype)
+
+def readCache(entry, key, skip = ()):
+    try:
+        with open(os.path.join(entry, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        if meta['key'] != key: return None
+        
+        samples = readSamples(os.path.join(entry, 'samples.bin'))
+        # the configured data is small, it is read into memory and does not keep a file open
+        configuredSamples = None
+        if any(stage['configured'] is not None for stage in meta['stages']):
+            configuredSamples = np.fromfile(os.path.join(entry, 'configured.bin'), dtype=np.uint8)
+        experimentalDataList = []
+        for stage in meta['stages']:
+            series = {name: sampleSeries(samples, position) for (name, position) in stage['series'].items()}
+            surveyData = stage['surveyData']
+            experimental_data = ExperimentalData(
+                level = stage['level'],
+                response = [Response(**response) for response in stage['response']],
+                # the skipped collected samples are left in the sample file
+                collectedData = CollectedDataColumns() if 'collectedData' in skip else CollectedDataColumns(
+                    series['collectedPupilSizes'],
+                    series['collectedRespiratoryRates'],
+                    series['hasRespiratoryRate']
+                ),
+                serialData = SerialData(
+                    pupilSizes = series['pupilSizes'],
+                    respiratoryRates = series['respiratoryRates']
+                ),
+                correctRate = stage['correctRate'],
+                surveyData = SurveyData(**surveyData) if surveyData is not None else None
+            )
+            experimental_data.quality = stage.get('quality')
+            if stage['configured'] is not None:
+                experimental_data.configuredData = SerialData(
+                    pupilSizes = sampleSeries(configuredSamples, stage['configured']['pupilSizes']),
+                    respiratoryRates = sampleSeries(configuredSamples, stage['configured']['respiratoryRates'])
+                )
+            experimentalDataList.append(experimental_data)
+            
+        return StorageData(
+            userData = UserData(**meta['userData']),
+            data = experimentalDataList,
+            comment = meta['comment'],
+            filePath = meta['filePath']
+        )
+    except OSError as e:
+        if e.errno == errno.EMFILE and raise_open_files_limit(): return readCache(entry, key, skip)
+        if e.errno in RESOURCE_ERRORS: raise
+        # missing cache entry
+        return None
+    except (ValueError, KeyError, TypeError):
+        # outdated or damaged cache entry
+        return None
 
 #cite: Preprocessing pupil size data: Guidelines and code - Mariska E. Kret, Elio E. Sjak-Shie 
-def normalized_outliers(raw_data, useMedian = False):
-    # Calculate the median absolute deviation from the median
-    mad = median_abs_deviation(raw_data)
+def normalized_outliers(raw_data, useMedian = False, axis = -1, m_value = MAD_THRESHOLD):
+    """
+    Clamp the outliers of a signal to the Median Absolute Deviation bounds.
     
-    median = np.median(raw_data)
+    Parameters:
+    raw_data (array like): The signal, or a 2-D batch of signals (e.g. one row per stage).
+    useMedian (bool): Replace the values inside the bounds by the median (default is False).
+    axis (int): The axis along which the bounds are computed for a batch (default is the last axis).
+    m_value (float): How many MADs away from the median a value becomes an outlier (default is MAD_THRESHOLD).
     
-    m_value = 2.5   # moderately conservative
+    Returns:
+    (normalized_data, upper, lower): The clamped array and its bounds (one bound per signal for a batch).
+    """
+    data = np.asarray(raw_data)
+    if not np.issubdtype(data.dtype, np.floating): data = data.astype(np.float64)
+    
+    median = np.median(data, axis=axis, keepdims=True)
+    
+    # Calculate the median absolute deviation from the median
+    mad = np.median(np.abs(data - median), axis=axis, keepdims=True)
 
     # Set lower and upper bounds from the median
     # cite: Christophe Leys et al. Detecting outliers: Do not use standard deviation around the mean, use absolute deviation around the median
@@ -198,20 +793,22 @@ def normalized_outliers(raw_data, useMedian = False):
     lower = median - m_value * mad
 
     # Filter data based on bounds
-    med = median if useMedian else None
-    normalized_data = list(
-        map(lambda x: normalized(x, upper, lower, replacement=med), raw_data)
-    )
+    inside = data if not useMedian else np.where(median != 0, median, data)
+    normalized_data = np.where(data > upper, upper, np.where(data < lower, lower, inside))
+
+    upper = np.squeeze(upper, axis=axis)
+    lower = np.squeeze(lower, axis=axis)
+    if data.ndim == 1: upper, lower = upper[()], lower[()]
 
     return (normalized_data, upper, lower)
  
  # find maximum value in a list
 def largest(arr):
-    return reduce(max, arr)
+    return np.max(arr)
 
 # find minimum value in a list
 def smallest(arr):
-    return reduce(min, arr)
+    return np.min(arr)
 
 # split a list into chunks of size `chunk_size`
 def split_list(lst, chunk_size):
@@ -234,57 +831,185 @@ class PupilData(float):
 		self.timestamp = 0
 
 def find_modulus_maxima(data):
+    """
+    Keep the local maxima of the signal modulus and set the other values to 0.
+    `data` can be a single signal or a batch of signals (one per row), the maxima are found along the last axis.
+    """
     # compute signal modulus
-    modulus = [0.0] * len(data)
-    for i in range(len(data)):
-        modulus[i] = math.fabs(data[i])
+    modulus = np.abs(np.asarray(data, dtype=np.float64))
+    length = modulus.shape[-1]
 
     # if value is larger than both neighbours , and strictly
     # larger than either, then it is a local maximum
-    local_maxima = [0.0]*len(data)
-    for i in range(len(data)):
-        left_neighbour = modulus[i-1] if i >= 1 else modulus[i]
-        current_value = modulus[i]
-        right_neighbour = modulus[i+1] if i < len(data)-2 else modulus[i]
-        if (left_neighbour <= current_value and current_value >= right_neighbour) and (left_neighbour < current_value or current_value > right_neighbour):
-            # compute magnitude
-            local_maxima[i] = math.sqrt(data[i]**2)
-        else:
-            local_maxima[i] = 0.0
-    return local_maxima
+    # (the first value is its own left neighbour, the last two values are their own right neighbour)
+    left_neighbour = modulus.copy()
+    left_neighbour[..., 1:] = modulus[..., :-1]
+    right_neighbour = modulus.copy()
+    if length > 2: right_neighbour[..., :length - 2] = modulus[..., 1:length - 1]
+    
+    is_maximum = (left_neighbour <= modulus) & (modulus >= right_neighbour) \
+        & ((left_neighbour < modulus) | (modulus > right_neighbour))
+    
+    # the magnitude of the maxima
+    return np.where(is_maximum, modulus, 0.0)
 
 # requirement: signal_samples is a list of float that represent the signal samples every one second.
-def compute_ipa(signal_samples: list[float]):
+# a 2-D batch (one signal per row, e.g. windows or stages of the same length) returns the IPA of each row.
+def compute_ipa(signal_samples: list[float], sample_rate: float = 1.0):
+    import pywt
+    samples = np.asarray(signal_samples, dtype=np.float64)
+    
     # obtain 2-level DWT of pupil diameter signal
     try:
-        (approx_coeff_2, detail_coeff_2, detail_coeff_1) = pywt.wavedec(signal_samples, 'sym16', 'per', level=2)
+        (_, detail_coeff_2, _) = pywt.wavedec(samples, 'sym16', 'per', level=2, axis=-1)
     except ValueError:
         return
 
     # get signal duration (IN SECONDS)
-    signal_duration = len(signal_samples)
+    signal_duration = samples.shape[-1] / sample_rate
 
-    # normalize by 1=2j , j = 2 for 2-level DWT
-    approx_coeff_2[:] = [x / math.sqrt(4.0) for x in approx_coeff_2]
-    detail_coeff_1[:] = [x / math.sqrt(2.0) for x in detail_coeff_1]
-    detail_coeff_2[:] = [x / math.sqrt(4.0) for x in detail_coeff_2]
+    # normalize by 1=2j , j = 2 for 2-level DWT (only the level 2 details are used)
+    detail_coeff_2 = detail_coeff_2 / math.sqrt(4.0)
 
     # detect modulus maxima
     modulus_maxima = find_modulus_maxima(detail_coeff_2)
 
     # threshold using universal threshold lambda_univ = s*sqrt(p(2 log n))
-    universal_threshold = np.std(modulus_maxima) * math.sqrt(2.0 * np.log2(len(modulus_maxima)))
     # where s is the standard deviation of the noise
-    thresholded_data = pywt.threshold(modulus_maxima, universal_threshold, mode='hard')
-
-    # compute IPA
-    count = 0
-    for i in range(len(thresholded_data)):
-        if math.fabs(thresholded_data[i]) > 0: count += 1
+    universal_threshold = np.std(modulus_maxima, axis=-1, keepdims=True) \
+        * math.sqrt(2.0 * np.log2(modulus_maxima.shape[-1]))
+    
+    # compute IPA, the count of maxima kept by the hard threshold
+    count = np.count_nonzero((modulus_maxima >= universal_threshold) & (modulus_maxima > 0), axis=-1)
   
-    ipa = float(count)/signal_duration
+    ipa = count / signal_duration
+    
+    return float(ipa) if samples.ndim == 1 else ipa
+
+def compute_windowed_ipa(signals, window = 5, hop = None, sample_rate = 1.0):
+    """
+    Calculate the IPA in windows sliding over one or more signals, transforming every window of every signal in one batch.
+    
+    Parameters:
+    signals (array like): A signal, a 2-D array with one signal per row, or a list of signals with different lengths.
+    window (int): The length of each window in samples (default is 5, which is 5 seconds of the configured pupil data).
+    hop (int): The distance between the start of two windows (default is `window`, the same chunks as `split_list`). 
+    A hop smaller than the window gives overlapping windows.
+    sample_rate (float): The number of samples each second (default is 1, the rate of the configured pupil data).
     
-    return ipa
+    Returns:
+    The IPA of each window: a list for a single signal, a 2-D array for a 2-D batch, 
+    or a list with the values of each signal for a list of signals. None if the windows cannot be decomposed.
+    """
+    hop = hop or window
+    
+    # the windows are views on the signals, they are only copied once into the batch given to the wavelet transform.
+    # the periodized DWT of a window depends on its own boundaries, so overlapping windows are still decomposed separately.
+    if isinstance(signals, np.ndarray) and signals.ndim == 2:
+        if signals.shape[-1] < window: return np.empty((signals.shape[0], 0))
+        windows = np.lib.stride_tricks.sliding_window_view(signals, window, axis=-1)[:, ::hop]
+        ipa = compute_ipa(windows.reshape(-1, window), sample_rate)
+        return None if ipa is None else ipa.reshape(windows.shape[:2])
+    
+    single = len(signals) == 0 or np.ndim(signals[0]) == 0
+    if single: signals = [signals]
+    
+    windows = [
+        np.lib.stride_tricks.sliding_window_view(np.asarray(signal, dtype=np.float64), window)[::hop]
+        if len(signal) >= window else np.empty((0, window))
+        for signal in signals
+    ]
+    counts = [len(signal_windows) for signal_windows in windows]
+    
+    if sum(counts) == 0:
+        ipa_values = [[] for _ in signals]
+    else:
+        ipa = compute_ipa(np.concatenate(windows), sample_rate)
+        if ipa is None: return
+        ipa_values = [values.tolist() for values in np.split(ipa, np.cumsum(counts)[:-1])]
+    
+    return ipa_values[0] if single else ipa_values
+
+class SlidingMedian:
+    """
+    Median of the last `window_size` values pushed, updated in O(log window_size) per value.
+    The window is split in two heaps (the lower half as a max heap and the upper half as a min heap),
+    values leaving the window are removed lazily when they reach the top of their heap.
+    """
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.window = deque()
+        self.lower = []     # negated values, the largest of the lower half on top
+        self.upper = []     # the smallest of the upper half on top
+        self.lowerSize = 0
+        self.upperSize = 0
+        self.removed = defaultdict(int)
+    
+    def __len__(self):
+        return len(self.window)
+    
+    def push(self, value: float):
+        value = float(value)
+        self.window.append(value)
+        if not self.lower or value <= -self.lower[0]:
+            heapq.heappush(self.lower, -value)
+            self.lowerSize += 1
+        else:
+            heapq.heappush(self.upper, value)
+            self.upperSize += 1
+        
+        if len(self.window) > self.window_size:
+            self._remove(self.window.popleft())
+        
+        self._balance()
+        
+        # removed values buried in the heaps are dropped by rebuilding them from the window once in a while,
+        # which keeps the memory bounded and costs O(1) per value on average
+        if len(self.lower) + len(self.upper) > 2 * self.window_size + 16:
+            self._rebuild()
+        return self.median()
+    
+    def median(self):
+        if not self.window: return math.nan
+        if self.lowerSize > self.upperSize: return -self.lower[0]
+        return (-self.lower[0] + self.upper[0]) / 2
+    
+    def _remove(self, value):
+        self.removed[value] += 1
+        if value <= -self.lower[0]:
+            self.lowerSize -= 1
+            if value == -self.lower[0]: self._prune(self.lower, -1)
+        else:
+            self.upperSize -= 1
+            if value == self.upper[0]: self._prune(self.upper, 1)
+    
+    def _balance(self):
+        if self.lowerSize > self.upperSize + 1:
+            heapq.heappush(self.upper, -heapq.heappop(self.lower))
+            self.lowerSize -= 1
+            self.upperSize += 1
+            self._prune(self.lower, -1)
+        elif self.lowerSize < self.upperSize:
+            heapq.heappush(self.lower, -heapq.heappop(self.upper))
+            self.lowerSize += 1
+            self.upperSize -= 1
+            self._prune(self.upper, 1)
+    
+    def _rebuild(self):
+        values = sorted(self.window)
+        half = (len(values) + 1) // 2
+        self.lower = [-value for value in reversed(values[:half])]
+        self.upper = values[half:]
+        self.lowerSize = len(self.lower)
+        self.upperSize = len(self.upper)
+        self.removed.clear()
+    
+    # drop the values that already left the window from the top of a heap
+    def _prune(self, heap, sign):
+        while heap and self.removed.get(sign * heap[0], 0) > 0:
+            value = sign * heapq.heappop(heap)
+            self.removed[value] -= 1
+            if self.removed[value] == 0: del self.removed[value]
 
 def compute_ripa(signal_samples: list[float], interval_length=5, window_length=11, polyorder=2, threshold=0.5):
     """
@@ -300,82 +1025,126 @@ def compute_ripa(signal_samples: list[float], interval_length=5, window_length=1
     Returns:
     ripa_values (list): The calculated RIPA values for each interval.
     """
-
-    def moving_median(data, window_size):
-        """Calculate the moving median with a given window size."""
-        return np.array([np.median(data[max(0, i - window_size):i + 1]) for i in range(len(data))])
-
-    def delta_function(value, threshold):
-        """Kronecker delta function modified for RIPA calculation."""
-        return 1 if value > threshold else 0
-
-    ripa_values = []
+    from scipy.signal import savgol_filter
     num_intervals = len(signal_samples) // interval_length
+    
+    if num_intervals == 0 or interval_length < window_length:
+        # If segment is smaller than window length, skip the calculation
+        return []
+    
+    # one interval per row, all the intervals are filtered at once
+    segments = np.asarray(signal_samples[:num_intervals * interval_length], dtype=np.float64)
+    segments = segments.reshape(num_intervals, interval_length)
+    
+    # Apply Savitzky-Golay filter to the segments
+    smoothed_data = savgol_filter(segments, window_length, polyorder, axis=-1)
+    first_derivative = savgol_filter(segments, window_length, polyorder, deriv=1, axis=-1)
+    
+    # Calculate RIPA for each segment
+    median = np.median(smoothed_data, axis=-1, keepdims=True)
+    count = np.count_nonzero(np.abs(first_derivative) > median + threshold, axis=-1)
+    ripa = count / interval_length
+    
+    # Normalize and invert RIPA
+    ripa_normalized = 1 - ripa
+    
+    return ripa_normalized.tolist()
 
-    for i in range(num_intervals):
-        start_idx = i * interval_length
-        end_idx = start_idx + interval_length
-        segment = signal_samples[start_idx:end_idx]
+class RipaStream:
+    """
+    RIPA of a signal received one sample at a time, over the last `interval_length` samples.
+    
+    The Savitzky-Golay smoothing and derivative are evaluated at the newest sample of the last `window_length` samples, 
+    and each derivative is compared with the moving median of the smoothed signal when it arrives.
+    Memory and work per sample only depend on the window and interval lengths, 
+    the values follow `compute_ripa` but are causal estimates rather than the same numbers.
+    """
+    def __init__(self, interval_length=5, window_length=11, polyorder=2, threshold=0.5):
+        from scipy.signal import savgol_coeffs
+        self.interval_length = interval_length
+        self.window_length = window_length
+        self.threshold = threshold
         
-        if len(segment) < window_length:
-            # If segment is smaller than window length, skip the calculation
-            continue
+        # filters evaluated at the last point of the window
+        self.smoothing = savgol_coeffs(window_length, polyorder, pos=window_length - 1, use='dot')
+        self.derivative = savgol_coeffs(window_length, polyorder, deriv=1, pos=window_length - 1, use='dot')
         
-        # Apply Savitzky-Golay filter to the segment
-        smoothed_data = savgol_filter(segment, window_length, polyorder)
-        first_derivative = savgol_filter(segment, window_length, polyorder, deriv=1)
+        self.samples = deque(maxlen=window_length)
+        self.median = SlidingMedian(interval_length)
+        self.oscillations = deque()
+        self.count = 0
+    
+    def update(self, sample: float):
+        """Add a sample and return the RIPA of the last interval, None until there are enough samples."""
+        self.samples.append(float(sample))
+        if len(self.samples) < self.window_length: return None
         
-        # Calculate RIPA for the segment
-        median = np.median(smoothed_data)
-        count = sum(1 if abs(first_derivative[j]) > median + threshold else 0 for j in range(len(first_derivative)))
-        ripa = count / len(first_derivative)
+        window = np.fromiter(self.samples, dtype=np.float64, count=self.window_length)
+        smoothed = float(self.smoothing @ window)
+        first_derivative = float(self.derivative @ window)
         
-        # Normalize and invert RIPA
-        ripa_normalized = 1 - ripa
+        median = self.median.push(smoothed)
+        oscillation = abs(first_derivative) > median + self.threshold
         
-        ripa_values.append(ripa_normalized)
+        self.oscillations.append(oscillation)
+        self.count += oscillation
+        if len(self.oscillations) > self.interval_length:
+            self.count -= self.oscillations.popleft()
+        
+        if len(self.oscillations) < self.interval_length: return None
+        return 1 - self.count / self.interval_length
     
-    return ripa_values
+    def extend(self, samples):
+        """Add several samples and return the RIPA after each of them."""
+        return [self.update(sample) for sample in samples]
 
-def compute_lhipa(pupil_diameter_data: list[float]):
+# Andrew T. Duchowski, Krzysztof Krejtz, Nina A. Gehrer, Tanya Bafna, and Per Bækgaard (2020). 
+# The Low/High Index of Pupillary Activity. In Proceedings of the 2020 CHI Conference on Human Factors in Computing Systems (CHI '20).
+# a 2-D batch (one signal per row, with the same length) returns the LHIPA of each row.
+def compute_lhipa(pupil_diameter_data: list[float], sample_rate: float = 1.0):
+    import pywt
+    samples = np.asarray(pupil_diameter_data, dtype=np.float64)
+    
     # find max decomposition level
     wavelet = pywt.Wavelet('sym16')
-    max_level = pywt.dwt_max_level(len(pupil_diameter_data), wavelet.dec_len)
+    max_level = pywt.dwt_max_level(samples.shape[-1], wavelet.dec_len)
     
     # set high and low frequency band indices
     high_freq, low_freq = 1, int(max_level/2)
     
-    # get detail coefficients of pupil diameter signal
-    high_freq_coeff = pywt.downcoef('d', pupil_diameter_data, 'sym16', 'per', level=high_freq)
-    low_freq_coeff = pywt.downcoef('d', pupil_diameter_data, 'sym16', 'per', level=low_freq)
+    # the signal is too short to have a low frequency band
+    if low_freq < high_freq: return
+    
+    # get detail coefficients of pupil diameter signal (coefficients of level j are at index -j)
+    coefficients = pywt.wavedec(samples, 'sym16', 'per', level=low_freq, axis=-1)
+    high_freq_coeff = coefficients[-high_freq]
+    low_freq_coeff = coefficients[-low_freq]
     
     # normalize by 1/sqrt(2^j)
-    high_freq_coeff[:] = [x / math.sqrt(2**high_freq) for x in high_freq_coeff]
-    low_freq_coeff[:] = [x / math.sqrt(2**low_freq) for x in low_freq_coeff]
+    high_freq_coeff = high_freq_coeff / math.sqrt(2**high_freq)
+    low_freq_coeff = low_freq_coeff / math.sqrt(2**low_freq)
     
-    # obtain the LH:HF ratio
-    lh_hf_ratio = low_freq_coeff
-    for index in range(len(lh_hf_ratio)):
-        lh_hf_ratio[index] = low_freq_coeff[index] / high_freq_coeff[((2**low_freq)/(2**high_freq))/index]
+    # obtain the LH:HF ratio, each low frequency coefficient is compared with the high frequency one at the same time
+    high_freq_index = ((2**low_freq / 2**high_freq) * np.arange(low_freq_coeff.shape[-1])).astype(int)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lh_hf_ratio = low_freq_coeff / high_freq_coeff[..., high_freq_index]
         
     # detect modulus maxima
     modulus_maxima = find_modulus_maxima(lh_hf_ratio)
     
     # threshold using universal threshold lambda_univ = omega*sqrt(p(2 log n))
     # where omega is the standard deviation of the noise
-    universal_threshold = np.std(modulus_maxima) * math.sqrt(2.0 * np.log2(len(modulus_maxima)))
-    thresholded_data = pywt.threshold(modulus_maxima, universal_threshold, mode='less')
+    universal_threshold = np.std(modulus_maxima, axis=-1, keepdims=True) \
+        * math.sqrt(2.0 * np.log2(modulus_maxima.shape[-1]))
     
     # get signal duration (in seconds)
-    signal_duration = len(pupil_diameter_data)
+    signal_duration = samples.shape[-1] / sample_rate
     
-    # compute LHIPA
-    count = 0
-    for i in range(len(thresholded_data)):
-        if math.fabs(thresholded_data[i]) > 0: count += 1
-    lhipa = float(count)/signal_duration
+    # compute LHIPA, the count of maxima kept by the `less` threshold
+    count = np.count_nonzero((modulus_maxima <= universal_threshold) & (modulus_maxima > 0), axis=-1)
+    lhipa = count / signal_duration
     
-    return lhipa
+    return float(lhipa) if samples.ndim == 1 else lhipa
 
 def compute_pupil_size_change(raw: list[float]):
     result = [0.0]
@@ -383,51 +1152,561 @@ def compute_pupil_size_change(raw: list[float]):
         result.append(raw[i] - raw[i - 1])
     return result
 
+@dataclass
+class LiveMetrics:
+    pupilSize: float | None
+    respiratoryRate: int | None
+    ripa: float | None = None
+    ipa: float | None = None
+    pupilOutlier: bool = False
+    respiratoryRateOutlier: bool = False
+
+class LiveProcessor:
+    """
+    Cognitive load metrics of a session while it is being recorded, from the samples given one at a time.
+    
+    Every pupil size updates the RIPA, the IPA is computed over the last `ipa_window` pupil sizes every `ipa_hop` samples,
+    and the pupil sizes and respiratory rates are flagged when they are outside the Median Absolute Deviation bounds 
+    of their last `outlier_window` values (the bounds are also updated every `ipa_hop` samples).
+    Only the last values of each window are kept, so memory and work per sample do not grow with the session.
+    """
+    def __init__(self, ipa_window = 60, ipa_hop = 5, outlier_window = 60, rr_outlier_window = 12, **ripa_parameters):
+        self.ipa_window = ipa_window
+        self.ipa_hop = ipa_hop
+        
+        self.ripa = RipaStream(**ripa_parameters)
+        self.pupils = deque(maxlen=max(ipa_window, outlier_window))
+        self.outlier_window = outlier_window
+        self.rates = deque(maxlen=rr_outlier_window)
+        
+        self.pupilCount = 0
+        self.rateCount = 0
+        self.ipa = None
+        self.pupilBounds = None
+        self.rateBounds = None
+        
+    def update(self, pupilSize: float | None = None, respiratoryRate: int | None = None):
+        metrics = LiveMetrics(pupilSize, respiratoryRate)
+        
+        if pupilSize is not None:
+            self.pupils.append(float(pupilSize))
+            self.pupilCount += 1
+            metrics.ripa = self.ripa.update(pupilSize)
+            
+            if self.pupilCount % self.ipa_hop == 0:
+                recent = list(self.pupils)
+                if len(recent) >= self.ipa_window: 
+                    self.ipa = compute_ipa(recent[-self.ipa_window:])
+                self.pupilBounds = self._bounds(recent[-self.outlier_window:])
+            metrics.ipa = self.ipa
+            metrics.pupilOutlier = self._outside(pupilSize, self.pupilBounds)
+        
+        if respiratoryRate is not None:
+            self.rates.append(float(respiratoryRate))
+            self.rateCount += 1
+            if self.rateCount % self.ipa_hop == 0 or self.rateBounds is None:
+                self.rateBounds = self._bounds(list(self.rates))
+            metrics.respiratoryRateOutlier = self._outside(respiratoryRate, self.rateBounds)
+            
+        return metrics
+    
+    @staticmethod
+    def _bounds(values):
+        if len(values) < 3: return None
+        (_, upper, lower) = normalized_outliers(values)
+        return (upper, lower)
+    
+    @staticmethod
+    def _outside(value, bounds):
+        if bounds is None: return False
+        (upper, lower) = bounds
+        return bool(value > upper or value < lower)
+
+def replay_session(storageData: StorageData, speed: float | None = REPLAY_SPEED, sample_rate: float = 1.0, processor_factory = LiveProcessor):
+    """
+    Feed the samples of a saved session to a LiveProcessor as if it was recorded again.
+    
+    Parameters:
+    storageData (StorageData): The session to replay.
+    speed (float): How many times faster than real time the samples are given (default is REPLAY_SPEED, None is as fast as possible).
+    sample_rate (float): The number of samples recorded each second (default is 1).
+    processor_factory: Creates the processor of each stage (default is LiveProcessor).
+    
+    Returns:
+    A generator of (stage, LiveMetrics) for each sample of each stage.
+    """
+    for stage in storageData.data:
+        processor = processor_factory()
+        
+        # the collected samples are in recording order, older files only have the serial data
+        if len(stage.collectedData) > 0:
+            samples = stage.collectedData
+        else:
+            pupils = stage.serialData.pupilSizes
+            rates = stage.serialData.respiratoryRates
+            step = len(pupils) / len(rates) if len(rates) > 0 else 0
+            rateAt = {int(index * step): rate for index, rate in enumerate(rates)}
+            samples = [CollectedData(float(pupil), rateAt.get(index)) for index, pupil in enumerate(pupils)]
+        
+        start = time.perf_counter()
+        for index, sample in enumerate(samples):
+            if speed:
+                # wait until the time the sample would have been recorded
+                delay = start + index / (sample_rate * speed) - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+            yield (stage, processor.update(sample.pupilSize, sample.respiratoryRate))
+
 def configured(stage: ExperimentalData):
-    original_rr = stage.serialData.respiratoryRates
-    original_pupils = stage.serialData.pupilSizes
+    # use the configured data computed ahead of time if there is one
+    if stage.configuredData is not None:
+        stage.serialData = stage.configuredData
+        stage.configuredData = None
+    else:
+        stage.serialData = configured_serialData(stage.serialData)
         
-    ### apply the interpolated in whole the experimentals's respiratory rate and replace to its serialData.respiratoryRates
+    return stage
+
+def configured_serialData(serialData: SerialData):
+    original_rr = serialData.respiratoryRates
+    original_pupils = serialData.pupilSizes
+        
+    ### apply the interpolated in whole the experimentals's respiratory rate
     rr_len = len(original_rr)
     rr_indicies = np.linspace(0, rr_len - 1, num=rr_len)
-    iterpolated_indices = np.linspace(0, rr_len - 1, num=60)
+    iterpolated_indices = np.linspace(0, rr_len - 1, num=PREPROCESSING.rrPoints)
         
-    # interpolated respiratory rate to match with 5 minutes of data and apply it back to the original respiratory rate data
-    stage.serialData.respiratoryRates = np.interp(iterpolated_indices, rr_indicies, original_rr)
+    # interpolated respiratory rate to match with the duration of the stage at the target rate
+    configured_rr = np.interp(iterpolated_indices, rr_indicies, original_rr)
         
-    ### apply the resampled and remove the outlier in whole the experimentals's pupilSizes and replace to its serialData.pupilSizes
+    ### apply the resampled and remove the outlier in whole the experimentals's pupilSizes
         
-    # resample the pupil size to match with 5 minutes of data (the raw data is around 298 anyway)
-    resampled_raw_pupil = resample(original_pupils, 300)
+    # fill the blinks and dropouts, then resample the pupil size to match with the duration of the stage at the target rate (the raw data is around 298 anyway)
+    resampled_raw_pupil = resampled_batch(interpolated_blinks([original_pupils]), PREPROCESSING.pupilPoints)[0]
         
     # filtered the outlier and replace them with the upper and lower boundary based on Median Absolute Deviation
-    (filtered_outlier_pupil, _ , _) = normalized_outliers(resampled_raw_pupil)
-            
-    # apply the filtered to original pupil data
-    stage.serialData.pupilSizes = filtered_outlier_pupil
+    (filtered_outlier_pupil, _ , _) = normalized_outliers(resampled_raw_pupil, m_value=PREPROCESSING.madThreshold)
         
-    return stage
+    return SerialData(pupilSizes = filtered_outlier_pupil, respiratoryRates = configured_rr)
 
-def configure_storageData(storageData: StorageData):
-    experimentals = storageData.data
+def interpolated_batch(signals: list[np.ndarray], points: int):
+    """
+    Linear interpolation of signals of any length to the same number of points, in one call.
     
-    # configure the respiratory rate and pupil size data
-    for stage in experimentals:
-        stage = configured(stage)
+    The signals are padded to the longest one and each row only reads its own samples, 
+    the values are the same as `np.interp` over the sample indices of each signal.
+    
+    Returns:
+    np.ndarray: one row of `points` values (float64) for each signal
+    """
+    lengths = np.array([len(signal) for signal in signals])
+    padded = np.zeros((len(signals), lengths.max()), dtype=np.float64)
+    for row, signal in enumerate(signals): padded[row, :len(signal)] = signal
+    
+    # the positions of the new points in each signal, computed like `np.linspace` does for one signal
+    # (with an array of ends it rounds every row differently as soon as one signal has a single sample)
+    positions = np.arange(points) * ((lengths - 1) / max(points - 1, 1))[:, np.newaxis]
+    positions[:, -1] = lengths - 1
+    rows = np.arange(len(signals))[:, np.newaxis]
+    left = np.minimum(np.floor(positions).astype(np.intp), lengths[:, np.newaxis] - 1)
+    right = np.minimum(left + 1, lengths[:, np.newaxis] - 1)
+    
+    slope = padded[rows, right] - padded[rows, left]
+    return slope * (positions - left) + padded[rows, left]
+
+def resampled_batch(signals: list[np.ndarray], points: int):
+    """
+    Fourier resampling of signals of any length to the same number of points.
+    
+    The signals with the same number of samples are resampled together in one call, 
+    so the FFT plan of each length is made once. The signals recorded much faster than the target rate 
+    (more than `decimateAbove` times `points` samples) are first decimated with a polyphase filter, 
+    so the FFT only runs on a short signal.
+    
+    Returns:
+    np.ndarray: one row of `points` values for each signal
+    """
+    from scipy.signal import resample, resample_poly
+    groups = defaultdict(list)
+    for row, signal in enumerate(signals): groups[len(signal)].append(row)
+    
+    resampled = [None] * len(signals)
+    for (length, rows) in groups.items():
+        group = np.stack([signals[row] for row in rows])
+        if length > PREPROCESSING.decimateAbove * points:
+            # low-pass filter and keep one sample in `factor`, which leaves between `points` and twice `points` samples
+            factor = length // points
+            group = resample_poly(group, 1, factor, axis=-1, padtype='line')
+        group = resample(group, points, axis=-1)
+        for (row, signal) in zip(rows, group): resampled[row] = signal
+    return np.stack(resampled)
+
+def configured_batch(serialDatas: List[SerialData]):
+    """
+    Configure the serialData of many stages at once (e.g. every stage of the cohort), 
+    with the same result as `configured_serialData` for each one.
+    
+    - the respiratory rates are interpolated to the target rate in one call
+    - the blinks and dropouts of all the pupil sizes are filled in one call
+    - the pupil sizes are resampled to the target rate in one call for each number of samples
+    - the outliers of all the resampled pupil sizes are filtered in one call
+    
+    Returns:
+    List[SerialData]: the configured data of each stage (views of the batch arrays)
+    """
+    if not serialDatas: return []
+    
+    # a stage without samples can't be configured, let `configured_serialData` fail the same way
+    if any(len(serialData.respiratoryRates) == 0 or len(serialData.pupilSizes) == 0 for serialData in serialDatas):
+        return [configured_serialData(serialData) for serialData in serialDatas]
+    
+    configured_rr = interpolated_batch([serialData.respiratoryRates for serialData in serialDatas], PREPROCESSING.rrPoints)
+    pupils = interpolated_blinks([serialData.pupilSizes for serialData in serialDatas])
+    resampled_pupils = resampled_batch(pupils, PREPROCESSING.pupilPoints)
+    (filtered_outlier_pupils, _, _) = normalized_outliers(resampled_pupils, axis=-1, m_value=PREPROCESSING.madThreshold)
+    
+    return [
+        SerialData(pupilSizes = pupils, respiratoryRates = rr) 
+        for (pupils, rr) in zip(filtered_outlier_pupils, configured_rr)
+    ]
+
+def longest_runs(signals: list[np.ndarray]):
+    """
+    The longest run of the same consecutive value in each signal, as a fraction of the signal (1 for a constant signal).
+    The signals are concatenated and the runs of all of them are found at once.
+    
+    Returns:
+    np.ndarray: one fraction for each signal (1 for an empty signal, like a constant one)
+    """
+    lengths = np.array([len(signal) for signal in signals], dtype=np.intp)
+    longest = np.zeros(len(signals))
+    present = lengths > 0
+    if not present.any(): return np.ones(len(signals))
+    
+    samples = np.concatenate([np.asarray(signal, dtype=np.float64) for signal in signals])
+    starts = np.cumsum(lengths) - lengths
+    
+    # a run starts at the first sample of each signal and where the value changes (a NaN is a run of its own)
+    change = np.ones(len(samples), dtype=bool)
+    change[1:] = samples[1:] != samples[:-1]
+    change[starts[present]] = True
+    runStarts = np.flatnonzero(change)
+    runLengths = np.diff(runStarts, append=len(samples))
+    
+    # the runs are in the order of the signals, the first run of a signal starts at its first sample
+    longest[present] = np.maximum.reduceat(runLengths, np.searchsorted(runStarts, starts[present]))
+    return np.where(present, longest / np.maximum(lengths, 1), 1.0)
+
+def batch_ranges(lengths, budget: int = BATCH_SAMPLES):
+    """
+    Split signals into consecutive batches whose padded array (the number of signals times the longest one) holds at most `budget` samples.
+    A signal longer than `budget` is a batch of its own.
+    
+    Returns:
+    list[tuple[int, int]]: the (start, end) of each batch
+    """
+    ranges = []
+    (start, longest) = (0, 0)
+    for (end, length) in enumerate(lengths):
+        if end > start and (end - start + 1) * max(longest, length) > budget:
+            ranges.append((start, end))
+            (start, longest) = (end, 0)
+        longest = max(longest, length)
+    if start < len(lengths): ranges.append((start, len(lengths)))
+    return ranges
+
+def padded_batch(signals: list[np.ndarray], fill = np.nan):
+    # the signals as the rows of one array (float64), padded to the longest one with `fill`
+    lengths = np.array([len(signal) for signal in signals], dtype=np.intp)
+    padded = np.full((len(signals), lengths.max(initial=0)), fill, dtype=np.float64)
+    for row, signal in enumerate(signals): padded[row, :len(signal)] = signal
+    return padded
+
+def row_medians(data: np.ndarray, counts: np.ndarray):
+    # the median of the first `counts` values of each row once sorted (the NaN are sorted last), NaN for a row without values
+    ordered = np.sort(data, axis=-1)
+    if ordered.shape[-1] == 0: return np.full(len(data), np.nan)
+    low = np.clip((counts - 1) // 2, 0, None)[:, np.newaxis]
+    high = np.clip(counts // 2, 0, ordered.shape[-1] - 1)[:, np.newaxis]
+    medians = (np.take_along_axis(ordered, low, -1) + np.take_along_axis(ordered, high, -1))[:, 0] / 2
+    return np.where(counts > 0, medians, np.nan)
+
+def quantization_steps(data: np.ndarray):
+    # the smallest difference between two distinct values of each row (the resolution of the recording), infinite for a constant row
+    differences = np.diff(np.sort(data, axis=-1), axis=-1)
+    return np.min(np.where(differences > 0, differences, np.inf), axis=-1, initial=np.inf)
+
+#cite: Preprocessing pupil size data: Guidelines and code - Mariska E. Kret, Elio E. Sjak-Shie 
+def interpolated_blinks(signals: list[np.ndarray]):
+    """
+    Find the blinks and tracker dropouts of raw pupil size signals and fill the gaps, for all the signals at once.
+    
+    - the invalid samples are the missing (NaN) or zero pupil sizes and the dilation speed outliers: 
+      the speed of a sample (its largest change to a neighbour, per second) is above the median plus `blinkSpeed` MADs of the signal
+      (the MAD is at least the speed of one step of the recording resolution)
+    - the gaps are padded by `blinkPadding` seconds on both sides, the pupil sizes around a blink are unreliable too
+    - the gaps are filled by linear interpolation between the valid samples around them, or by a cubic (Hermite) curve 
+      following the slope of the signal on both sides with `blinkFill` 'cubic'. The gaps at the edges take the nearest valid sample.
+    
+    The sample rate of a signal is its number of samples over the duration of the stage (see `Preprocessing`).
+    The signals are processed in batches of BATCH_SAMPLES padded samples (see `batch_ranges`).
+    
+    Returns:
+    list[np.ndarray]: the filled signals (the same arrays for the signals without gaps or without any valid sample)
+    """
+    if PREPROCESSING.blinkFill == 'none' or not signals: return list(signals)
+    
+    cleaned = []
+    for (start, end) in batch_ranges([len(signal) for signal in signals]):
+        cleaned.extend(_interpolated_blinks(signals[start:end]))
+    return cleaned
+
+def _interpolated_blinks(signals: list[np.ndarray]):
+    # the blinks of one batch of signals, see `interpolated_blinks`
+    lengths = np.array([len(signal) for signal in signals], dtype=np.intp)
+    data = padded_batch(signals)
+    (rows, width) = data.shape
+    columns = np.arange(width)
+    inside = columns < lengths[:, np.newaxis]
+    rate = (lengths / PREPROCESSING.duration)[:, np.newaxis]
+    
+    # the dilation speed of each sample, the NaN (padding and missing samples) have no speed
+    change = np.abs(np.diff(data, axis=-1)) * rate
+    speed = np.full(data.shape, np.nan)
+    speed[:, 1:] = change
+    speed[:, :-1] = np.fmax(speed[:, :-1], change)
+    counts = np.count_nonzero(~np.isnan(speed), axis=-1)
+    median = row_medians(speed, counts)[:, np.newaxis]
+    mad = row_medians(np.abs(speed - median), counts)[:, np.newaxis]
+    # the MAD is 0 when most samples do not change (quantized signals), a change of one step of the recording is not a blink
+    mad = np.maximum(mad, quantization_steps(data)[:, np.newaxis] * rate)
+    invalid = inside & (~(data > 0) | (speed > median + PREPROCESSING.blinkSpeed * mad))
+    if not invalid.any(): return list(signals)
+    
+    # pad the gaps: the samples close enough to an invalid sample before or after them
+    padding = np.round(PREPROCESSING.blinkPadding * rate).astype(np.intp)
+    far = 2 * width + padding.max()
+    previousInvalid = np.maximum.accumulate(np.where(invalid, columns, -far), axis=-1)
+    nextInvalid = np.minimum.accumulate(np.where(invalid, columns, far)[:, ::-1], axis=-1)[:, ::-1]
+    gap = inside & ((columns - previousInvalid <= padding) | (nextInvalid - columns <= padding))
+    valid = inside & ~gap
+    
+    # the valid samples around each gap (-1 and `width` when there is none)
+    previous = np.maximum.accumulate(np.where(valid, columns, -1), axis=-1)
+    following = np.minimum.accumulate(np.where(valid, columns, width)[:, ::-1], axis=-1)[:, ::-1]
+    hasPrevious, hasFollowing = previous >= 0, following < width
+    start = np.take_along_axis(data, np.clip(previous, 0, width - 1), -1)
+    end = np.take_along_axis(data, np.clip(following, 0, width - 1), -1)
+    
+    span = np.maximum(following - previous, 1)
+    t = (columns - previous) / span
+    secant = end - start
+    filled = start + t * secant
+    if PREPROCESSING.blinkFill == 'cubic':
+        # the slopes (per sample) of the signal before and after the gap, the secant of the gap when the neighbour is not valid
+        def slope(index, step):
+            neighbour = np.clip(index + step, 0, width - 1)
+            usable = (index + step >= 0) & (index + step < width) & np.take_along_axis(valid, neighbour, -1)
+            return np.where(usable, step * (np.take_along_axis(data, neighbour, -1) - np.take_along_axis(data, np.clip(index, 0, width - 1), -1)) * span, secant)
+        (t2, t3) = (t * t, t * t * t)
+        filled = (2 * t3 - 3 * t2 + 1) * start + (t3 - 2 * t2 + t) * slope(previous, -1) \
+            + (-2 * t3 + 3 * t2) * end + (t3 - t2) * slope(following, 1)
+    filled = np.where(hasPrevious & hasFollowing, filled, np.where(hasPrevious, start, end))
+    
+    cleaned = list(signals)
+    for row in np.flatnonzero(gap.any(axis=-1) & valid.any(axis=-1)):
+        signal = signals[row]
+        dtype = signal.dtype if np.issubdtype(signal.dtype, np.floating) else np.float64
+        cleaned[row] = np.where(gap[row, :lengths[row]], filled[row, :lengths[row]], data[row, :lengths[row]]).astype(dtype)
+    return cleaned
+
+def quality_metrics(serialDatas: List[SerialData]):
+    """
+    The data-quality metrics of the raw signals of a batch of stages, computed at once for all of them (see `StageQuality`).
+    
+    Returns:
+    list[dict]: the pupilSamples, rrSamples, constantRun, dropout and clipped of each stage
+    """
+    pupils = [serialData.pupilSizes for serialData in serialDatas]
+    rates = [serialData.respiratoryRates for serialData in serialDatas]
+    pupilSamples = np.array([len(pupil) for pupil in pupils], dtype=np.intp)
+    rrSamples = np.array([len(rate) for rate in rates], dtype=np.intp)
+    
+    constantRun = np.maximum(longest_runs(pupils), longest_runs(rates))
+    
+    # zero or negative pupil sizes and NaN are dropouts (the padding is NaN too)
+    data = padded_batch(pupils)
+    valid = data > 0
+    counts = valid.sum(axis=-1)
+    dropout = np.where(pupilSamples > 0, 1 - counts / np.maximum(pupilSamples, 1), 1.0)
+    
+    # the MAD bounds of `normalized_outliers`, without the dropouts
+    data[~valid] = np.nan
+    median = row_medians(data, counts)[:, np.newaxis]
+    mad = row_medians(np.abs(data - median), counts)[:, np.newaxis]
+    # at least one step of the recording, like for the blinks
+    mad = np.maximum(mad, quantization_steps(data)[:, np.newaxis])
+    outside = valid & ((data > median + PREPROCESSING.madThreshold * mad) | (data < median - PREPROCESSING.madThreshold * mad))
+    clipped = np.where(counts > 0, outside.sum(axis=-1) / np.maximum(counts, 1), 0.0)
+    
+    return [
+        {'pupilSamples': values[0], 'rrSamples': values[1], 'constantRun': values[2], 'dropout': values[3], 'clipped': values[4]}
+        for values in zip(pupilSamples.tolist(), rrSamples.tolist(), constantRun.tolist(), dropout.tolist(), clipped.tolist())
+    ]
+
+class StageQuality:
+    """
+    Data-quality metrics of the raw signals of many stages (e.g. every stage of the cohort), computed in batches of BATCH_SAMPLES padded samples 
+    (see `quality_metrics`), and the stages kept by the screening thresholds of PREPROCESSING.
+    
+    - constantRun: longest run of the same value, as a fraction of the signal (the largest of the pupil sizes and respiratory rates)
+    - dropout: fraction of missing (NaN) or zero pupil sizes
+    - clipped: fraction of the other pupil sizes outside the MAD bounds of the stage (the MAD is at least one step of the recording resolution)
+    - length: number of samples over the median number of samples of the stages (the smallest of the pupil sizes and respiratory rates)
+    
+    The metrics already known (e.g. saved in the cache) are passed in `metrics` (None for a stage to compute), their samples are not read.
+    """
+    def __init__(self, serialDatas: List[SerialData], sessions: list[str] | None = None, levels: list[str] | None = None, metrics: list[dict | None] | None = None):
+        self.sessions = sessions if sessions is not None else [''] * len(serialDatas)
+        self.levels = levels if levels is not None else [''] * len(serialDatas)
         
-    # filter the list to remove the corrupted data (which has the same value in whole the pupil size data)
-    experimentals = list(
-        filter(
-            lambda stage: not all_same(stage.serialData.pupilSizes) 
-            and not all_same(stage.serialData.respiratoryRates), 
-            experimentals
+        metrics = list(metrics) if metrics is not None else [None] * len(serialDatas)
+        missing = [row for (row, stageMetrics) in enumerate(metrics) if stageMetrics is None]
+        for (start, end) in batch_ranges([len(serialDatas[row].pupilSizes) for row in missing]):
+            rows = missing[start:end]
+            for (row, stageMetrics) in zip(rows, quality_metrics([serialDatas[row] for row in rows])): metrics[row] = stageMetrics
+        self.stageMetrics = metrics
+        
+        def column(name, dtype = np.float64):
+            return np.array([stageMetrics[name] for stageMetrics in metrics], dtype=dtype)
+        self.pupilSamples = column('pupilSamples', np.intp)
+        self.rrSamples = column('rrSamples', np.intp)
+        self.constantRun = column('constantRun')
+        self.dropout = column('dropout')
+        self.clipped = column('clipped')
+        
+        def relative(samples):
+            expected = np.median(samples[samples > 0]) if (samples > 0).any() else 1
+            return samples / expected
+        self.length = np.minimum(relative(self.pupilSamples), relative(self.rrSamples))
+        
+        self.constant = self.constantRun >= PREPROCESSING.maxConstantRun
+        self.droppedOut = self.dropout > PREPROCESSING.maxDropout
+        self.overClipped = self.clipped > PREPROCESSING.maxClipped
+        self.short = self.length < PREPROCESSING.minLength
+        self.kept = ~(self.constant | self.droppedOut | self.overClipped | self.short)
+        
+        # the number of dropped stages of each session, counted once for all of them
+        (names, session) = np.unique(np.asarray(self.sessions, dtype=str), return_inverse=True)
+        counts = np.bincount(session, weights=~self.kept, minlength=len(names)).astype(int)
+        self.droppedStages = dict(zip(names.tolist(), counts.tolist()))
+        
+        # set by `configure_storagesData`: the kept stages whose configured data is constant, and the sessions without any stage left
+        self.configuredConstant = np.zeros(len(self.kept), dtype=bool)
+        self.excluded: list[str] = []
+    
+    @classmethod
+    def of(cls, storagesData: List[StorageData]):
+        # the quality of every stage of the sessions, in order (the metrics of a stage are only computed when it has none yet)
+        stages = [(storageData, stage) for storageData in storagesData for stage in storageData.data]
+        return cls(
+            [stage.serialData for (_, stage) in stages],
+            sessions = [Pipeline.session_name(storageData) for (storageData, _) in stages],
+            levels = [stage.level for (_, stage) in stages],
+            metrics = [stage.quality for (_, stage) in stages]
         )
+    
+    def __len__(self):
+        return len(self.kept)
+    
+    def reasons(self, row: int):
+        # why a stage is dropped
+        checks = [
+            (self.constant, 'constant'), (self.droppedOut, 'dropout'), (self.overClipped, 'clipped'), (self.short, 'short'),
+            (self.configuredConstant, 'constant once configured')
+        ]
+        return [reason for (mask, reason) in checks if mask[row]]
+    
+    def dropped(self, session: str):
+        return self.droppedStages.get(session, 0)
+
+def write_quality_report(quality: StageQuality):
+    # the quality of each stage before the screening, why the dropped ones are dropped and whether their session is left out
+    excluded = set(quality.excluded)
+    with open(f'{folderPath}/data_quality.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Session', 'Level', 'Pupil Samples', 'RR Samples', 'Constant Run', 'Dropout', 'Clipped', 'Length', 'Kept', 'Reasons', 'Session Kept'])
+        for row in range(len(quality)):
+            writer.writerow([
+                quality.sessions[row], quality.levels[row], quality.pupilSamples[row], quality.rrSamples[row],
+                f'{quality.constantRun[row]:.3f}', f'{quality.dropout[row]:.3f}', f'{quality.clipped[row]:.3f}', f'{quality.length[row]:.3f}',
+                'yes' if quality.kept[row] and not quality.configuredConstant[row] else 'no', ' '.join(quality.reasons(row)),
+                'no' if quality.sessions[row] in excluded else 'yes'
+            ])
+
+def configure_storagesData(storagesData: List[StorageData], cacheDir: str | None = None):
+    """
+    Screen the raw stages of all the sessions (see `StageQuality`), configure the kept ones in batches (see `configured_batch`)
+    and remove the corrupted ones. The stages configured ahead of time (e.g. loaded from the cache) are not configured again.
+    The sessions without any stage left are removed from `storagesData` (see `StageQuality.excluded`), they have nothing to average or plot.
+    
+    Parameters:
+    cacheDir (str): Folder of the cache the sessions were loaded from (default is None), the new quality metrics and configured data are saved in their entries.
+    
+    Returns:
+    StageQuality: the quality of every stage of the sessions before the screening
+    """
+    # the stages of each session in the order of its cache entry
+    sessionStages = [list(storageData.data) for storageData in storagesData]
+    
+    # the bad stages are dropped before they are resampled
+    measured = {id(stage) for stages in sessionStages for stage in stages if stage.quality is None}
+    quality = StageQuality.of(storagesData)
+    for (stage, stageMetrics) in zip((stage for stages in sessionStages for stage in stages), quality.stageMetrics):
+        stage.quality = stageMetrics
+    kept = iter(quality.kept)
+    for storageData in storagesData:
+        storageData.data = [stage for stage in storageData.data if next(kept)]
+    
+    # in batches of BATCH_SAMPLES padded samples, the peak memory does not grow with the cohort
+    pending = [stage for storageData in storagesData for stage in storageData.data if stage.configuredData is None]
+    lengths = [max(len(stage.serialData.pupilSizes), len(stage.serialData.respiratoryRates)) for stage in pending]
+    for (start, end) in batch_ranges(lengths):
+        batch = pending[start:end]
+        for (stage, configuredData) in zip(batch, configured_batch([stage.serialData for stage in batch])):
+            stage.configuredData = configuredData
+    
+    if cacheDir is not None:
+        computed = measured | {id(stage) for stage in pending}
+        for (storageData, stages) in zip(storagesData, sessionStages):
+            if storageData.filePath is None or not any(id(stage) in computed for stage in stages): continue
+            try:
+                updateCache(cache_path(cacheDir, storageData.filePath), cache_key(storageData.filePath), stages)
+            except (OSError, ValueError, KeyError) as e:
+                print("Error writing cache file:", e)
+    
+    for storageData in storagesData:
+        for stage in storageData.data: configured(stage)
+    
+    # the configured signal of a stage can still be constant (e.g. clamped to the median by the MAD filter), it is corrupted
+    stages = [stage for storageData in storagesData for stage in storageData.data]
+    constant = (
+        (longest_runs([stage.serialData.pupilSizes for stage in stages]) >= 1) 
+        | (longest_runs([stage.serialData.respiratoryRates for stage in stages]) >= 1)
     )
+    rows = {id(stage): row for (row, stage) in enumerate(stage for stages in sessionStages for stage in stages)}
+    quality.configuredConstant[np.array([rows[id(stage)] for stage in stages], dtype=np.intp)] = constant
+    constant = iter(constant)
+    for storageData in storagesData:
+        storageData.data = [stage for stage in storageData.data if not next(constant)]
+    
+    quality.excluded = [Pipeline.session_name(storageData) for storageData in storagesData if not storageData.data]
+    storagesData[:] = [storageData for storageData in storagesData if storageData.data]
     
-    storageData.data = experimentals
+    return quality
 
-def all_same(lst):
-    return all(x == lst[0] for x in lst)
+def configure_storageData(storageData: StorageData):
+    # configure the respiratory rate and pupil size data of one session
+    return configure_storagesData([storageData])
 
 class ExperimentDataType(Enum):
     PUPIL = 1
@@ -455,11 +1734,7 @@ class GrandAverage:
         self.hard = hard
         
     def combined(self):
-        result = []
-        for element in self.easy: result.append(element)
-        for element in self.normal: result.append(element)
-        for element in self.hard: result.append(element)
-        return result
+        return np.concatenate([self.easy, self.normal, self.hard])
         
     def min(self):
         return smallest(self.combined())
@@ -470,216 +1745,496 @@ class GrandAverage:
     def average(self):
         return np.average([self.easy, self.normal, self.hard], axis=0)
     
+    # remove the outliers of every level, in a single batch when the levels have the same length
+    def remove_outliers(self):
+        levels = [self.easy, self.normal, self.hard]
+        lengths = set(map(len, levels))
+        if len(lengths) == 1 and 0 not in lengths:
+            (self.easy, self.normal, self.hard) = normalized_outliers(np.vstack(levels))[0]
+        else:
+            (self.easy, self.normal, self.hard) = [
+                normalized_outliers(level)[0] if len(level) > 0 else level for level in levels
+            ]
+    
+# running sum, count, min and max (and optionally the variance) of signals with the same length, for each time index
+class SignalAccumulator:
+    def __init__(self, variance: bool = False):
+        self.count = 0
+        self.sum = None
+        self.min = None
+        self.max = None
+        # Welford running mean and sum of squared differences, only kept when the variance is needed
+        self.withVariance = variance
+        self.runningMean = None
+        self.m2 = None
+        # buffers reused by every update so adding a signal does not allocate
+        self._delta = None
+        self._scratch = None
+        
+    def add(self, signal):
+        signal = np.asarray(signal, dtype=np.float64)
+        
+        if self.count == 0:
+            self.sum = signal.copy()
+            self.min = signal.copy()
+            self.max = signal.copy()
+            if self.withVariance:
+                self.runningMean = signal.copy()
+                self.m2 = np.zeros_like(signal)
+                self._delta = np.empty_like(signal)
+                self._scratch = np.empty_like(signal)
+            self.count = 1
+            return self
+        
+        if signal.shape != self.sum.shape:
+            raise ValueError(f'signal of shape {signal.shape} cannot be added to signals of shape {self.sum.shape}')
+        
+        self.count += 1
+        np.add(self.sum, signal, out=self.sum)
+        np.minimum(self.min, signal, out=self.min)
+        np.maximum(self.max, signal, out=self.max)
+        
+        if self.withVariance:
+            # delta = x - mean; mean += delta / n; m2 += delta * (x - mean)
+            delta = np.subtract(signal, self.runningMean, out=self._delta)
+            self.runningMean += np.divide(delta, self.count, out=self._scratch)
+            self.m2 += np.multiply(delta, np.subtract(signal, self.runningMean, out=self._scratch), out=self._scratch)
+        return self
+    
+    # combine with an accumulator of other signals (e.g. computed in another process)
+    def merge(self, other: 'SignalAccumulator'):
+        if other.count == 0: return self
+        if self.withVariance and not other.withVariance:
+            raise ValueError('an accumulator without variance cannot be merged into one with variance')
+        if self.count == 0:
+            self.count = other.count
+            self.sum = other.sum.copy()
+            self.min = other.min.copy()
+            self.max = other.max.copy()
+            if self.withVariance:
+                self.runningMean = other.runningMean.copy()
+                self.m2 = other.m2.copy()
+                self._delta = np.empty_like(self.sum)
+                self._scratch = np.empty_like(self.sum)
+            return self
+        
+        if other.sum.shape != self.sum.shape:
+            raise ValueError(f'signals of shape {other.sum.shape} cannot be merged with signals of shape {self.sum.shape}')
+        
+        count = self.count + other.count
+        if self.withVariance:
+            # Chan et al. parallel variance
+            delta = other.runningMean - self.runningMean
+            self.m2 += other.m2 + delta ** 2 * (self.count * other.count / count)
+            self.runningMean += delta * (other.count / count)
+        
+        self.count = count
+        np.add(self.sum, other.sum, out=self.sum)
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        return self
+    
+    def mean(self):
+        if self.count == 0: return np.empty(0)
+        return self.sum / self.count
+    
+    def variance(self, ddof: int = 0):
+        if not self.withVariance:
+            raise ValueError('the accumulator was created without variance')
+        if self.count <= ddof: return np.full_like(self.sum, np.nan) if self.count else np.empty(0)
+        return self.m2 / (self.count - ddof)
+
+# one accumulator for each level of the task (easy, normal, hard)
+class LevelAccumulator:
+    def __init__(self, type: ExperimentDataType, variance: bool = False):
+        self.type = type
+        self.easy = SignalAccumulator(variance)
+        self.normal = SignalAccumulator(variance)
+        self.hard = SignalAccumulator(variance)
+        
+    def level(self, stage: ExperimentalData):
+        if stage.level_as_number() == 1: return self.easy
+        elif stage.level_as_number() == 2: return self.normal
+        else: return self.hard
+        
+    def add(self, stage: ExperimentalData):
+        # dertemine the data set based on the type
+        if self.type == ExperimentDataType.PUPIL: dataSet = stage.serialData.pupilSizes
+        else: dataSet = stage.serialData.respiratoryRates
+        
+        # skip the empty data set
+        if len(dataSet) == 0: return self
+        
+        self.level(stage).add(dataSet)
+        return self
+    
+    def merge(self, other: 'LevelAccumulator'):
+        self.easy.merge(other.easy)
+        self.normal.merge(other.normal)
+        self.hard.merge(other.hard)
+        return self
+    
+    def grand_average(self):
+        return GrandAverage(self.type, self.easy.mean(), self.normal.mean(), self.hard.mean())
+    
 # grand average of the data in the list of storageData to combine the data
 def grand_mean(type: ExperimentDataType, storageDatas: List[StorageData]):
-        easy = MeanInformation(type, 0, 0, 0)
-        normal = MeanInformation(type, 0, 0, 0)
-        hard = MeanInformation(type, 0, 0, 0)
-        for storageData in storageDatas:
-            for stage in storageData.data:
-                # dertemine the data set based on the type
-                if type == ExperimentDataType.PUPIL: dataSet = stage.serialData.pupilSizes
-                else: dataSet = stage.serialData.respiratoryRates
-                
-                mean = np.mean(dataSet)
-                upper = np.max(dataSet)
-                lower = np.min(dataSet)
-                
-                # skip the loop if this is an empty data set
-                if len(dataSet) == 0: continue
-    
-                # determine the level of the stage and calculate mean of the data
-                if stage.level_as_number() == 1:
-                   if easy.mean == 0 and easy.upper == 0 and easy.lower == 0:
-                       easy.mean = mean
-                       easy.upper = upper
-                       easy.lower = lower
-                   else:
-                       easy.mean = (easy.mean + mean) / 2
-                       easy.upper = max(easy.upper, upper)
-                       easy.lower = min(easy.lower, lower)
-                    
-                elif stage.level_as_number() == 2:
-                    if normal.mean == 0 and normal.upper == 0 and normal.lower == 0:
-                        normal.mean = mean
-                        normal.upper = upper
-                        normal.lower = lower
-                    else:
-                        normal.mean = (normal.mean + mean) / 2
-                        normal.upper = max(normal.upper, upper)
-                        normal.lower = min(normal.lower, lower)
-                else:
-                    if hard.mean == 0 and hard.upper == 0 and hard.lower == 0:
-                        hard.mean = mean
-                        hard.upper = upper
-                        hard.lower = lower
-                    else:
-                        hard.mean = (hard.mean + mean) / 2
-                        hard.upper = max(hard.upper, upper)
-                        hard.lower = min(hard.lower, lower)
-        return Mean(type, easy, normal, hard)
+    # mean of the stage means, and the lowest and highest value of the stages for each level
+    means = {level: SignalAccumulator() for level in (1, 2, 3)}
+    bounds = {level: SignalAccumulator() for level in (1, 2, 3)}
+    
+    for storageData in storageDatas:
+        for stage in storageData.data:
+            # dertemine the data set based on the type
+            if type == ExperimentDataType.PUPIL: dataSet = stage.serialData.pupilSizes
+            else: dataSet = stage.serialData.respiratoryRates
+            
+            # skip the loop if this is an empty data set
+            if len(dataSet) == 0: continue
+            
+            level = stage.level_as_number() if stage.level_as_number() in (1, 2) else 3
+            means[level].add(np.mean(dataSet))
+            bounds[level].add(np.min(dataSet))
+            bounds[level].add(np.max(dataSet))
+    
+    def information(level):
+        if means[level].count == 0: return MeanInformation(type, 0, 0, 0)
+        return MeanInformation(type, float(means[level].mean()), float(bounds[level].max), float(bounds[level].min))
+            
+    return Mean(type, information(1), information(2), information(3))
 
 # grand average of the data in the list of storageData to combine the data (as signal)
 # in the same level across the whole candidates
 def grand_average_signal(type: ExperimentDataType, list: List[StorageData]):
     print(f'avg signal data of {type}')
-    easy_data = []
-    normal_data = []
-    hard_data = []
+    accumulator = LevelAccumulator(type)
     
     for storageData in list:
         for stage in storageData.data:
-            # dertemine the data set based on the type
-            if type == ExperimentDataType.PUPIL: 
-                dataSet = stage.serialData.pupilSizes
-            else: 
-                dataSet = stage.serialData.respiratoryRates
+            accumulator.add(stage)
             
-            # skip the loop if this is an empty data set
-            if len(dataSet) == 0: continue
+    return accumulator.grand_average()
 
-            # determine the level of the stage and calculate average the data
-            # Calculate the average of each loop to get the grand average of the whole list
-            if stage.level_as_number() == 1:
-                if len(easy_data) == 0: 
-                    easy_data = dataSet
-                else: 
-                    easy_data = np.average([easy_data, dataSet], axis=0)
-            elif stage.level_as_number() == 2:
-                if len(normal_data) == 0: 
-                    normal_data = dataSet
-                else: 
-                    normal_data = np.average([normal_data, dataSet], axis=0)
-            else:
-                if len(hard_data) == 0: 
-                    hard_data = dataSet
-                else: 
-                    hard_data = np.average([hard_data, dataSet], axis=0)
-    return GrandAverage(type, easy_data, normal_data, hard_data)
+# age band of a participant, e.g. '20-29'
+def age_band(age: str):
+    try:
+        decade = int(age) // 10 * 10
+    except ValueError:
+        return 'unknown'
+    return f'{decade}-{decade + 9}'
 
-def analyze_median(storagesData: List[StorageData]):
-    print('level, mean pupul diameter (mm), mean respiratory rate (bpm)')
+class StudyIndex:
+    """
+    Index of the stages of a study, built once and read by the aggregate plots.
     
-    # 2D list to store name and pupil data of each candidate
-    pupil_data_all: list[list[str]] = []
+    The stages are grouped by level, participant, gender and age band, 
+    and the summary values of every stage are kept in one array per column (NaN when a value is missing).
+    The summaries are taken from the data when the index is built (e.g. the configured data after the configuration step).
+    """
+    columns = ['meanPupil', 'meanRR', 'correctRate', 'accuracy', 'omission', 'reactionTime', 'difficulty', 'stressful']
     
-    # 2D list to store name and respiratory rate data of each candidate
-    rr_data_all: list[list[str]] = []
+    def __init__(self, storagesData: List[StorageData]):
+        self.participants = [storageData.userData for storageData in storagesData]
+        self.stages: List[ExperimentalData] = []
+        
+        participant, level, gender, ageBand = [], [], [], []
+        values = {column: [] for column in StudyIndex.columns}
+        
+        for number, storageData in enumerate(storagesData):
+            userData = storageData.userData
+            for stage in storageData.data:
+                self.stages.append(stage)
+                participant.append(number)
+                level.append(stage.level_as_number())
+                gender.append(userData.gender)
+                ageBand.append(age_band(userData.age))
+                
+                pupils = stage.serialData.pupilSizes
+                rates = stage.serialData.respiratoryRates
+                surveyData = stage.surveyData
+                values['meanPupil'].append(np.mean(pupils) if len(pupils) > 0 else np.nan)
+                values['meanRR'].append(np.mean(rates) if len(rates) > 0 else np.nan)
+                values['correctRate'].append(stage.correctRate)
+                values['accuracy'].append(stage.accuracy())
+                values['omission'].append(stage.omission())
+                values['reactionTime'].append(stage.mean_reaction_time())
+                values['difficulty'].append(surveyData.q1Answer if surveyData else None)
+                values['stressful'].append(surveyData.q2Answer if surveyData else None)
+        
+        self.participant = np.array(participant, dtype=np.intp)
+        self.level = np.array(level, dtype=np.intp)
+        self.gender = np.array(gender, dtype=str)
+        self.ageBand = np.array(ageBand, dtype=str)
+        self.values = {
+            column: np.array([np.nan if value is None else value for value in column_values], dtype=np.float64) 
+            for column, column_values in values.items()
+        }
+        
+    def __len__(self):
+        return len(self.stages)
+    
+    # positions of the stages in each group of a grouping ('level', 'participant', 'gender' or 'ageBand')
+    def groups(self, by: str):
+        keys = getattr(self, by)
+        return {key.item(): np.flatnonzero(keys == key) for key in np.unique(keys)}
+    
+    # values of a column for the selected stages, e.g. index.column('meanPupil', level=1, gender='Female')
+    def column(self, name: str, **selection):
+        mask = np.ones(len(self), dtype=bool)
+        for by, key in selection.items():
+            mask &= getattr(self, by) == key
+        values = self.values[name][mask]
+        # missing values are left out
+        return values[~np.isnan(values)]
+    
+    # values of a column for the easy, normal and hard levels
+    def by_level(self, name: str, **selection):
+        return [self.column(name, level=level, **selection) for level in (1, 2, 3)]
+
+# the individual tables saved by `analyze_median`, one csv file each, 
+# with the StudyIndex column and the format of the values of each table
+median_metrics = {
+    'individual_mean_respiratory_rate': ('meanRR', '%.2f'),
+    'individual_mean_pupil_diameter': ('meanPupil', '%.2f'),
+    'individual_accuracy_rate': ('correctRate', '%.1f'),
+    'individual_omission_rate': ('omission', '%d'),
+    'individual_reaction_time': ('reactionTime', '%.2f'),
+    'individual_rating_difficulty': ('difficulty', '%d'),
+    'individual_rating_stressful': ('stressful', '%d')
+}
+median_tables = list(median_metrics)
+
+median_levels = ['easy', 'normal', 'hard']
+
+def analyze_median(storagesData: List[StorageData]):
+    print('level, mean pupul diameter (mm), mean respiratory rate (bpm)')
     
-    # 2D list to store name and accuracy data of each candidate
-    accuracy_data_all: list[list[str]] = []
+    for data in storagesData:
+        print(f'🙆🏻 analyzing data from {data.userData.name}')
     
-    # 2D list to store name and omission data of each candidate
-    omission_data_all: list[list[str]] = []
+    # save the data to csv files
+    write_median_tables(metric_table(storagesData))
+
+def formatted_values(values: np.ndarray, format: str):
+    # a missing float is written 'nan' like "{:.2f}".format does, a missing integer (e.g. a survey answer) is left empty
+    text = np.full(values.shape, 'nan' if format.endswith('f') else '', dtype=object)
+    present = ~np.isnan(values)
+    text[present] = np.char.mod(format, values[present])
+    return text
+
+# the columns of the tidy table of the individual metrics
+metric_columns = ['session', 'name', 'age', 'gender', 'level', 'metric', 'recorded', 'value', 'text']
+
+def metric_table(storagesData: List[StorageData]):
+    """
+    The individual metrics of the sessions as one tidy table: a row for each session, level and metric, in this order.
     
-    # 2D list to store name and reaction time data of each candidate
-    reaction_time_data_all: list[list[str]] = []
+    Returns:
+    dict: the columns of the table (see `metric_columns`). `recorded` tells whether the session has a stage of the level,
+    `value` is the metric (NaN when it is missing) and `text` the value written in the tables.
+    """
+    index = StudyIndex(storagesData)
+    grid = (len(storagesData), len(median_levels), len(median_metrics))
+    
+    # the stages of the easy, normal and hard levels (the last one wins when a level is repeated)
+    known = (index.level >= 1) & (index.level <= len(median_levels))
+    session, level = index.participant[known], index.level[known] - 1
+    
+    recorded = np.zeros(grid, dtype=bool)
+    value = np.full(grid, np.nan)
+    text = np.full(grid, '', dtype=object)
+    recorded[session, level] = True
+    for (metric, (column, format)) in enumerate(median_metrics.values()):
+        value[session, level, metric] = index.values[column][known]
+        text[session, level, metric] = formatted_values(index.values[column][known], format)
+    
+    # the same value for the rows of each session, level or metric
+    def repeated(values, axis):
+        shape = [1, 1, 1]
+        shape[axis] = -1
+        return np.broadcast_to(np.asarray(values, dtype=object).reshape(shape), grid).ravel()
+    
+    userData = [storageData.userData for storageData in storagesData]
+    return {
+        'session': np.repeat(np.arange(grid[0]), grid[1] * grid[2]),
+        'name': repeated([user.name for user in userData], 0),
+        'age': repeated([user.age for user in userData], 0),
+        'gender': repeated([user.gender for user in userData], 0),
+        'level': repeated(median_levels, 1),
+        'metric': repeated([table.removeprefix('individual_') for table in median_tables], 2),
+        'recorded': recorded.ravel(),
+        'value': value.ravel(),
+        'text': text.ravel()
+    }
+
+def concat_tables(tables: list[dict]):
+    # the sessions of each table follow the ones of the previous tables
+    rows = len(median_levels) * len(median_metrics)
+    offsets = np.cumsum([0] + [len(table['session']) // rows for table in tables])
+    combined = {
+        column: np.concatenate([np.asarray(table[column], dtype=object) for table in tables] or [np.empty(0, dtype=object)]) 
+        for column in metric_columns
+    }
+    combined['session'] = np.concatenate([np.asarray(table['session'], dtype=np.intp) + offset for (table, offset) in zip(tables, offsets)] or [np.empty(0, dtype=np.intp)])
+    combined['recorded'] = combined['recorded'].astype(bool)
+    combined['value'] = combined['value'].astype(np.float64)
+    return combined
+
+def write_median_tables(table: dict):
+    """
+    Save the tidy table of the individual metrics (`individual_metrics.csv`, and `individual_metrics.parquet` 
+    when pyarrow is installed) and the individual tables derived from it: one csv file for each metric,
+    with a row for each session and a column for each level ('x' when the session has no stage of the level).
+    """
+    with open(f'{folderPath}/individual_metrics.csv', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Session', 'Name', 'Age', 'Gender', 'Level', 'Metric', 'Value'])
+        writer.writerows(zip(*(table[column] for column in ['session', 'name', 'age', 'gender', 'level', 'metric', 'text'])))
     
-    # 2D list to store name and rating data of each candidate (difficulty)
-    rating_data_difficulty_all: list[list[str]] = []
+    try:
+        import pyarrow, pyarrow.parquet
+        columnar = {column: np.asarray(table[column]).tolist() for column in metric_columns if column != 'text'}
+        pyarrow.parquet.write_table(pyarrow.table(columnar), f'{folderPath}/individual_metrics.parquet')
+    except ImportError:
+        pass
     
-    # 2D list to store name and rating data of each candidate (stressful)
-    rating_data_stressful_all: list[list[str]] = []
+    grid = (len(table['session']) // (len(median_levels) * len(median_metrics)), len(median_levels), len(median_metrics))
+    text = np.where(np.asarray(table['recorded'], dtype=bool), np.asarray(table['text'], dtype=object), 'x').reshape(grid)
+    # name, age and gender of each session, from its first row
+    people = np.stack([np.asarray(table[column], dtype=object)[::grid[1] * grid[2]] for column in ['name', 'age', 'gender']], axis=-1)
     
     headers = ['Name', 'Age', 'Gender', 'Easy', 'Normal', 'Hard']
+    for (metric, name) in enumerate(median_tables):
+        with open(f'{folderPath}/{name}.csv', mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(headers)
+            writer.writerows(np.concatenate([people, text[:, :, metric]], axis=-1).tolist())
+
+def analyze_incremental(path, cacheDir, workers: int | None = PLOT_WORKERS, show_ipa: bool = False):
+    """
+    Update the outputs of a study folder for the sessions that are new or changed since the last run.
+    
+    A manifest (`.manifest.json` in the folder) keeps the cache key, metric table and plot of each processed session.
+    The metrics of unchanged sessions are reused, only the individual plots of new or changed sessions are drawn again
+    (and the missing ones, the ones drawn with or without the IPA row when `show_ipa` is not the same, 
+    or the ones whose grand average respiratory rate moved more than OVERLAY_TOLERANCE), 
+    and the aggregate plots are redrawn only when something changed.
+    The individual plots are drawn by `workers` processes (see `PlotRenderer`).
+    """
+    # the outputs are written in the study folder, like `Pipeline`
+    global folderPath
+    folderPath = path
+    manifestPath = os.path.join(path, '.manifest.json')
+    manifest = {'parameters': preprocessing_parameters(), 'sessions': {}, 'overlays': {}}
+    try:
+        with open(manifestPath, 'r') as file:
+            saved = json.load(file)
+        # a manifest made with other preprocessing parameters does not describe the current outputs
+        if saved.get('parameters') == manifest['parameters']: manifest = saved
+    except (OSError, json.JSONDecodeError):
+        pass
+    sessions = manifest['sessions']
+    
+    filenames = session_filenames(path)
+    keys = {filename: cache_key(os.path.join(path, filename)) for filename in filenames}
+    
+    # the sessions of a manifest made before the tidy table was saved are analyzed again
+    changed = {
+        filename for filename in filenames 
+        if sessions.get(filename, {}).get('key') != keys[filename] or 'table' not in sessions[filename]
+    }
+    removed = set(sessions) - set(filenames)
+    
+    # the plots drawn with or without the IPA row are drawn again when it is asked the other way
+    ipaChanged = any(sessions.get(filename, {}).get('ipa', False) != show_ipa for filename in filenames)
+    if not changed and not removed and not ipaChanged:
+        print('🙆🏻 nothing changed since the last run')
+        return
+    print(f'🙆🏻 {len(changed)} new or changed, {len(removed)} removed session(s)')
+    
+    for filename in removed:
+        del sessions[filename]
+    
+    # unchanged sessions come from the cache, they are still needed for the grand average and the aggregate plots
+    data = readJsonFilesFromFolder(path, cacheDir=cacheDir)
+    if not data: return
+    # ignore the files added while this run was going on
+    data = [storageData for storageData in data if os.path.basename(storageData.filePath) in keys]
+    
+    for storageData in data:
+        filename = os.path.basename(storageData.filePath)
+        if filename in changed:
+            print(f'🙆🏻 analyzing data from {storageData.userData.name}')
+            table = metric_table([storageData])
+            sessions[filename] = {'key': keys[filename], 'table': {column: table[column].tolist() for column in metric_columns}}
+    
+    write_median_tables(concat_tables([sessions[filename]['table'] for filename in filenames]))
+    
+    quality = configure_storagesData(data, cacheDir)
+    write_quality_report(quality)
+    # the sessions without any stage left have no plot
+    for filename in quality.excluded:
+        if filename in sessions:
+            sessions[filename].pop('plot', None)
+            sessions[filename].pop('overlay', None)
+            sessions[filename]['ipa'] = show_ipa
+    if quality.excluded: print(f'🙆🏻 {len(quality.excluded)} session(s) excluded without any stage left')
+    if not data: return
     
-    # number = 1
-    
-    for data in storagesData:
-        print(f'🙆🏻 analyzing data from {data.userData.name}')
-        # name = 'Candidate ' + str(number)
-        pupil_data = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        rr_data = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        
-        accuracy_data = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        omission_data = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        reaction_time_data = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        
-        rating_data_difficulty = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        
-        rating_data_stressful = [data.userData.name, data.userData.age, data.userData.gender, 'x', 'x', 'x']
-        
-        # number += 1
-        
-        for stage in data.data:
-            configured_rr = stage.serialData.respiratoryRates
-            configured_pupils = stage.serialData.pupilSizes
-            # mean pupil diameter
-            mean_pupil = np.mean(configured_pupils)
-            
-            #mean respiratory rate
-            mean_rr = np.mean(configured_rr)
-            
-            # accuracy rate
-            accuracy = stage.correctRate
-            
-            #omission
-            omission = stage.omission()
-            
-            reaction_time = stage.mean_reaction_time()
-            
-            #because easy = 1, normal = 2, hard = 3; we add 2 to the index 
-            pupil_data[stage.level_as_number() + 2] = "{:.2f}".format(mean_pupil)
-            rr_data[stage.level_as_number() + 2] = "{:.2f}".format(mean_rr)
-            accuracy_data[stage.level_as_number() + 2] = "{:.1f}".format(accuracy)
-            omission_data[stage.level_as_number() + 2] = omission
-            reaction_time_data[stage.level_as_number() + 2] = "{:.2f}".format(reaction_time)
-            rating_data_difficulty[stage.level_as_number() + 2] = stage.surveyData.q1Answer
-            rating_data_stressful[stage.level_as_number() + 2] = stage.surveyData.q2Answer
-            
-        rr_data_all.append(rr_data)
-        pupil_data_all.append(pupil_data)
-        accuracy_data_all.append(accuracy_data)
-        omission_data_all.append(omission_data)
-        reaction_time_data_all.append(reaction_time_data)
-        rating_data_difficulty_all.append(rating_data_difficulty)
-        rating_data_stressful_all.append(rating_data_stressful)
-        
-    # save the data to csv files
-    
-    with open(f'{folderPath}/individual_mean_respiratory_rate.csv', mode='w', newline='') as rr_file:
-        rr_writer = csv.writer(rr_file)
-        rr_writer.writerow(headers)
-        for row in rr_data_all:
-            rr_writer.writerow(np.array(row))
-    
-    with open(f'{folderPath}/individual_mean_pupil_diameter.csv', mode='w', newline='') as pupil_file:
-        pupil_writer = csv.writer(pupil_file)
-        pupil_writer.writerow(headers)
-        for row in pupil_data_all:
-            pupil_writer.writerow(np.array(row))
+    grand_average_pupil_signal = grand_average_signal(ExperimentDataType.PUPIL, data)
+    grand_average_rr_signal = grand_average_signal(ExperimentDataType.RR, data)
+    grand_average_rr_signal.remove_outliers()
+    grand_average_pupil_signal.remove_outliers()
+    
+    # the grand average respiratory rate drawn in the individual plots
+    overlay = {
+        'easy': np.asarray(grand_average_rr_signal.easy).tolist(),
+        'normal': np.asarray(grand_average_rr_signal.normal).tolist(),
+        'hard': np.asarray(grand_average_rr_signal.hard).tolist()
+    }
+    overlayKey = hashlib.sha1(json.dumps(overlay).encode()).hexdigest()
+    overlays = manifest['overlays']
+    
+    def overlay_moved(previousKey):
+        previous = overlays.get(previousKey)
+        if previous is None: return True
+        for level, signal in overlay.items():
+            if len(previous[level]) != len(signal): return True
+            if len(signal) > 0 and np.max(np.abs(np.subtract(previous[level], signal))) > OVERLAY_TOLERANCE: return True
+        return False
+    
+    renderer = PlotRenderer(workers)
+    for storageData in data:
+        filename = os.path.basename(storageData.filePath)
+        session = sessions[filename]
+        plotMissing = not os.path.exists(session.get('plot', ''))
+        ipaChanged = session.get('ipa', False) != show_ipa
+        if filename in changed or plotMissing or ipaChanged or overlay_moved(session.get('overlay')):
+            renderer.submit(storageData, grand_average_pupil_signal, grand_average_rr_signal, show_ipa=show_ipa)
+            session['overlay'] = overlayKey
+            session['plot'] = plot_path(storageData)
+            session['ipa'] = show_ipa
             
-    with open(f'{folderPath}/individual_accuracy_rate.csv', mode='w', newline='') as accuracy_file:
-        accuracy_writer = csv.writer(accuracy_file)
-        accuracy_writer.writerow(headers)
-        for row in accuracy_data_all:
-            accuracy_writer.writerow(np.array(row))
-    
-    with open(f'{folderPath}/individual_omission_rate.csv', mode='w', newline='') as omission_file:
-        omission_writer = csv.writer(omission_file)
-        omission_writer.writerow(headers)
-        for row in omission_data_all:
-            omission_writer.writerow(np.array(row))
-    
-    with open(f'{folderPath}/individual_reaction_time.csv', mode='w', newline='') as reaction_time_file:
-        reaction_time_writer = csv.writer(reaction_time_file)
-        reaction_time_writer.writerow(headers)
-        for row in reaction_time_data_all:
-            reaction_time_writer.writerow(np.array(row))
-    
-    with open(f'{folderPath}/individual_rating_difficulty.csv', mode='w', newline='') as rating_difficulty_file:
-        rating_difficulty_writer = csv.writer(rating_difficulty_file)
-        rating_difficulty_writer.writerow(headers)
-        for row in rating_data_difficulty_all:
-            rating_difficulty_writer.writerow(np.array(row))
-    
-    with open(f'{folderPath}/individual_rating_stressful.csv', mode='w', newline='') as rating_stressful_file:
-        rating_stressful_writer = csv.writer(rating_stressful_file)
-        rating_stressful_writer.writerow(headers)
-        for row in rating_data_stressful_all:
-            rating_stressful_writer.writerow(np.array(row))
+    overlays[overlayKey] = overlay
+    # only keep the grand averages that are still drawn in some plot
+    manifest['overlays'] = {key: overlays[key] for key in {session['overlay'] for session in sessions.values() if 'overlay' in session}}
+    
+    index = StudyIndex(data)
+    survey_box_plot(index)
+    accuracy_box_plot(index)
+    omission_box_plot(index)
+    reaction_time_box_plot(index)
+    mean_box_plot_rr(index)
+    mean_box_plot_pupil(index)
+    
+    renderer.wait()
+    
+    # the manifest is saved last, an interrupted run is done again next time
+    with open(manifestPath, 'w') as file:
+        json.dump(manifest, file)
             
 def grand_avg_box_plot(grand_avg: list[GrandAverage]):
+    import matplotlib.pyplot as plt
     
     fig, axis = plt.subplots(1, len(grand_avg), figsize=(14, 7))
     
@@ -701,21 +2256,9 @@ def grand_avg_box_plot(grand_avg: list[GrandAverage]):
     plt.close()
     print(f'🙆🏻 box plot saved at {plot}')
     
-def mean_box_plot_rr(storagesData: List[StorageData]):
-    easy = []
-    normal = []
-    hard = []
-    
-    for data in storagesData:
-        for stage in data.data:
-            configured_rr = stage.serialData.respiratoryRates
-            
-            #mean respiratory rate
-            mean_rr = np.mean(configured_rr)
-            
-            if stage.level_as_number() == 1: easy.append(mean_rr)
-            elif stage.level_as_number() == 2: normal.append(mean_rr)
-            else: hard.append(mean_rr)
+def mean_box_plot_rr(index: StudyIndex):
+    import matplotlib.pyplot as plt
+    (easy, normal, hard) = index.by_level('meanRR')
     
     fig, axis = plt.subplots()
     
@@ -732,21 +2275,9 @@ def mean_box_plot_rr(storagesData: List[StorageData]):
     plt.close()
     print(f'🙆🏻 box plot saved at {plot}')
 
-def mean_box_plot_pupil(storagesData: List[StorageData]):
-    easy = []
-    normal = []
-    hard = []
-    
-    for data in storagesData:
-        for stage in data.data:
-            configured_pupils = stage.serialData.pupilSizes
-            # mean pupil diameter
-            
-            mean_pupil = np.mean(configured_pupils)
-            
-            if stage.level_as_number() == 1: easy.append(mean_pupil)
-            elif stage.level_as_number() == 2: normal.append(mean_pupil)
-            else: hard.append(mean_pupil)
+def mean_box_plot_pupil(index: StudyIndex):
+    import matplotlib.pyplot as plt
+    (easy, normal, hard) = index.by_level('meanPupil')
     
     fig, axis = plt.subplots()
     
@@ -763,8 +2294,82 @@ def mean_box_plot_pupil(storagesData: List[StorageData]):
     plt.close()
     print(f'🙆🏻 box plot saved at {plot}')
    
+class PlotTemplate:
+    """
+    Figure of the individual plots for a number of stages, with its axes, lines, labels and legends made once.
+    Each candidate only sets the data and the limits of the lines before the figure is saved.
+    """
+    def __init__(self, stages: int, show_ipa: bool = False):
+        import matplotlib.pyplot as plt
+        self.figure, self.axis = plt.subplots(3 if show_ipa else 2, stages, figsize=size, squeeze=False)
+        self.show_ipa = show_ipa
+        self.laid_out = False
+        
+        axis = self.axis
+        axis[0, 0].set_ylabel('pupil diameter (resampled & outliners filtered-in mm)')
+        axis[1, 0].set_ylabel('estimaterd respiratory rate (breaths per minute)')
+        if show_ipa: axis[2, 0].set_ylabel('index of pupillary activity (Hz)')
+        
+        self.lines = []
+        for index in range(stages):
+            lines = {}
+            (lines['pupil'],) = axis[0, index].plot([], [], color='brown', label='pupil diameter')
+            (lines['normalized_pupil'],) = axis[0, index].plot([], [], color='black', label='normalized')
+            axis[0, index].set_xlabel('time (s)')
+            axis[0, index].legend()
+            
+            (lines['rr'],) = axis[1, index].plot([], [], color='red', label='Respiratoy rate')
+            (lines['avg_rr'],) = axis[1, index].plot([], [], color='green', label='grand average respiratory rate', linestyle='dashed', alpha=0.7)
+            axis[1, index].set_xlabel(f'time (every {PREPROCESSING.rrInterval:g}s)')
+            axis[1, index].legend()
+            
+            if show_ipa:
+                (lines['ipa'],) = axis[2, index].plot([], [], color='purple', label='IPA')
+                (lines['normalized_ipa'],) = axis[2, index].plot([], [], color='black', label='normalized')
+                axis[2, index].set_xlabel(f'time (every {PREPROCESSING.ipaWindow:g}s)')
+                axis[2, index].legend()
+            self.lines.append(lines)
+    
+    def set_data(self, row: int, index: int, data: dict, ylim = None):
+        lines = self.lines[index]
+        for name, (x, y) in data.items():
+            lines[name].set_data(x, y)
+        
+        axis = self.axis[row, index]
+        axis.relim()
+        axis.autoscale_view(scaley=ylim is None)
+        if ylim is not None: axis.set_ylim(*ylim)
+    
+    def save(self, plot):
+        # Adjust layout to prevent overlapping of labels (the layout of the first candidate is kept for the next ones)
+        if not self.laid_out:
+            self.figure.tight_layout()
+            self.laid_out = True
+        self.figure.savefig(plot)
+
+# templates of the individual plots of this process, by number of stages and IPA row
+_plot_templates: dict[tuple[int, bool], PlotTemplate] = {}
+
+def plot_template(stages: int, show_ipa: bool = False):
+    key = (stages, show_ipa)
+    if key not in _plot_templates:
+        _plot_templates[key] = PlotTemplate(stages, show_ipa)
+    return _plot_templates[key]
+
 # generate plots for each candidate
-def generate_plot(storageData: StorageData, grand_avg_pupil: GrandAverage, grand_avg_rr: GrandAverage):
+# `show_ipa` adds a row with the IPA of each 5 seconds of the pupil diameter
+def smoothed_pupil(pupil):
+    """
+    Smooth a configured pupil size signal with a Savitzky-Golay filter (a line in each window) over `smoothing` seconds.
+    The window is the whole signal when the stage is shorter (e.g. with a short `duration`), a signal of less than 2 samples is not smoothed.
+    """
+    from scipy.signal import savgol_filter
+    window = min(PREPROCESSING.pupil_samples(PREPROCESSING.smoothing), len(pupil))
+    if window < 2: return np.asarray(pupil)
+    return savgol_filter(pupil, window, 1)
+
+def generate_plot(storageData: StorageData, grand_avg_pupil: GrandAverage, grand_avg_rr: GrandAverage, show_ipa: bool = False):
+    from scipy.signal import savgol_filter
     print(f'🙆🏻 making plot of data from {storageData.userData.name}')
     
     experimentals = storageData.data
@@ -780,11 +2385,17 @@ def generate_plot(storageData: StorageData, grand_avg_pupil: GrandAverage, grand
     # sort the stages based on the level
     experimentals.sort(key=lambda stage: stage.level_as_number())
     
-    # create the plot
-    fig, axis = plt.subplots(2, len(experimentals), figsize=size)
-    axis[0, 0].set_ylabel('pupil diameter (resampled & outliners filtered-in mm)')
-    # axis[1, 0].set_ylabel('Change in pupil diameter over time (mm)')
-    axis[1, 0].set_ylabel('estimaterd respiratory rate (breaths per minute)')
+    # here we calculate the IPA in each section of 5 seconds of every stage at once, 
+    # the configured pupil data contains each element for each second already
+    if show_ipa:
+        ipa_values = compute_windowed_ipa(
+            [stage.serialData.pupilSizes for stage in experimentals], 
+            window=PREPROCESSING.pupil_samples(PREPROCESSING.ipaWindow), 
+            sample_rate=PREPROCESSING.pupilRate
+        )
+    
+    # the figure is made once for each number of stages
+    template = plot_template(len(experimentals), show_ipa)
     
     # iterate through each stage and draw the plot
     for index, stage in enumerate(experimentals):
@@ -801,75 +2412,98 @@ def generate_plot(storageData: StorageData, grand_avg_pupil: GrandAverage, grand
             # avg_pupil = grand_avg_pupil.hard
             avg_rr = grand_avg_rr.hard
         
-        # apply savgol filter to smooth the pupil data in a window of 60 samples (which mean 60 seconds)
-        normalized_pupil = savgol_filter(configured_pupils, 60, 1)
-        
-        # # mean pupil diameter
-        # mean_pupil = np.mean(configured_pupils)
-        
-        # mean_rr = np.mean(configured_rr)
-        
-        # calculation of changed pupil size over time
-        # pupil_size_change_over_time = compute_pupil_size_change(configured_pupils)
-        # normalized_pupil_size_change = savgol_filter(pupil_size_change_over_time, 5, 1)
-        
-        # # mapping the pupilData to IPA, `resampled_raw_pupil` contains each element for each second already
-        # splited = split_list(configured_pupils, 5)
-        
-        # # here we calculate the IPA in each section of 5 seconds.
-        # ipa_values = list(map(lambda data: compute_ipa(data), splited))
-        
-        # # smoothing the IPA values
-        # smoothed_ipa_values = savgol_filter(ipa_values, 5, 1)
-        
-        # # the time blocks for IPA calculation (each 5 seconds)
-        # ipa_time_blocks = list(map(lambda index: index * 5, range(len(ipa_values))))
+        # apply savgol filter to smooth the pupil data in a window of 60 seconds
+        normalized_pupil = smoothed_pupil(configured_pupils)
         
-        time = list(map(lambda index: index * 5, range(len(configured_rr))))
+        time = PREPROCESSING.rr_times(len(configured_rr))
         
-        pupil_raw_time = np.arange(len(configured_pupils))
+        pupil_raw_time = PREPROCESSING.pupil_times(len(configured_pupils))
         
         # information of the stage
         level = stage.level_as_n_back()
         
         collumnName =  f'level: {level}'
         
-        axis[0, index].plot(pupil_raw_time, configured_pupils, color='brown', label='pupil diameter')
-        axis[0, index].plot(pupil_raw_time, normalized_pupil, color='black', label='normalized')
-        # axis[0, index].plot(pupil_raw_time, avg_pupil, color='green', label='grand average', linestyle='solid', alpha=0.4)
-        axis[0, index].set_ylim(pupil_min_bound, pupil_up_bound)
-        # axis[0, stageIndex].set_ylim(2.2, 4.4)
-        axis[0, index].set_xlabel('time (s)')
-        axis[0, index].set_title(collumnName, size='large')
-        axis[0, index].legend()
-        
-        # axis[1, index].plot(pupil_raw_time, pupil_size_change_over_time, color='orange', label='Pupil diameter change over time')
-        # axis[1, index].plot(pupil_raw_time, normalized_pupil_size_change, color='black', label='normalized value')
-        # axis[1, index].set_xlabel('time (every 5s)')
-        # axis[1, index].legend()
+        template.set_data(0, index, {
+            'pupil': (pupil_raw_time, configured_pupils),
+            'normalized_pupil': (pupil_raw_time, normalized_pupil)
+        }, ylim=(pupil_min_bound, pupil_up_bound))
+        template.axis[0, index].set_title(collumnName, size='large')
         
-        axis[1, index].plot(time, configured_rr, color='red', label='Respiratoy rate')
-        axis[1, index].plot(time, avg_rr, color='green', label='grand average respiratory rate', linestyle='dashed', alpha=0.7)
-        axis[1, index].set_ylim(minRR, maxRR)
-        axis[1, index].set_xlabel('time (every 5s)')
-        axis[1, index].legend()
+        # the grand average is left out when there is none for the level
+        template.set_data(1, index, {
+            'rr': (time, configured_rr),
+            'avg_rr': (time, avg_rr) if len(avg_rr) == len(time) else ([], [])
+        }, ylim=(minRR, maxRR))
         
-    # userData = storageData.userData
-    # plt.suptitle(f'{userData.gender} - {userData.age}', fontweight = 'bold', fontsize=18)
-    
-    # Adjust layout to prevent overlapping of labels
-    plt.tight_layout()
+        if show_ipa:
+            # the time blocks for IPA calculation (each 5 seconds)
+            ipa_time_blocks = np.arange(len(ipa_values[index])) * PREPROCESSING.ipaWindow
+            # smoothing the IPA values
+            smoothed = savgol_filter(ipa_values[index], 5, 1) if len(ipa_values[index]) >= 5 else []
+            template.set_data(2, index, {
+                'ipa': (ipa_time_blocks, ipa_values[index]),
+                'normalized_ipa': (ipa_time_blocks[:len(smoothed)], smoothed)
+            })
     
     # save the plot
-    plots_dir = f'{folderPath}/plots'
-    os.makedirs(plots_dir, exist_ok=True)
-    plot = f'{plots_dir}/{storageData.userData.name} ({storageData.userData.levelTried}).png'
+    plot = plot_path(storageData)
+    os.makedirs(os.path.dirname(plot), exist_ok=True)
     
-    plt.savefig(plot)
-    plt.close()
+    template.save(plot)
     print(f'🙆🏻 plot saved at {plot}')
-    
+    return plot
+    
+def plot_path(storageData: StorageData):
+    return f'{folderPath}/plots/{storageData.userData.name} ({storageData.userData.levelTried}).png'
+    
+def _init_render_worker(folder, preprocessing):
+    import matplotlib.pyplot as plt
+    global folderPath, PREPROCESSING
+    folderPath = folder
+    PREPROCESSING = preprocessing
+    # render without a display
+    plt.switch_backend('Agg')
+
+class PlotRenderer:
+    """
+    Draw the individual plots in a pool of processes, so the rest of the analysis goes on while the images are encoded.
+    Each plot is saved at `plot_path` of its session; `wait` returns the saved paths in the order the plots were submitted.
+    """
+    def __init__(self, workers: int | None = PLOT_WORKERS):
+        workers = workers or os.cpu_count() or 1
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(folderPath, PREPROCESSING))
+        self.pending = {}
+        self.plots = []
+    
+    def submit(self, storageData: StorageData, grand_avg_pupil: GrandAverage, grand_avg_rr: GrandAverage, show_ipa: bool = False):
+        if self.executor is None:
+            self.plots.append(generate_plot(storageData, grand_avg_pupil, grand_avg_rr, show_ipa))
+            return
+        
+        # a later session with the same plot path is drawn after the earlier one, so the last one submitted is kept
+        plot = plot_path(storageData)
+        if plot in self.pending: self.pending[plot].result()
+        
+        # only the serial data is needed for the plot
+        stages = [replace(stage, response=[], collectedData=CollectedDataColumns()) for stage in storageData.data]
+        future = self.executor.submit(
+            generate_plot, replace(storageData, data=stages), grand_avg_pupil, grand_avg_rr, show_ipa
+        )
+        self.pending[plot] = future
+        self.plots.append(future)
+        
+    def wait(self):
+        plots = [plot.result() if not isinstance(plot, str) else plot for plot in self.plots]
+        if self.executor is not None: self.executor.shutdown()
+        self.pending = {}
+        self.plots = []
+        return plots
+
 def generate_grand_average_plot(grand_avg_pupil: GrandAverage, grand_avg_rr: GrandAverage):
+    import matplotlib.pyplot as plt
     print(f'🙆🏻 generate grand average plot')
     levels = [
         ('Easy Task', grand_avg_pupil.easy, grand_avg_rr.easy), 
@@ -883,14 +2517,14 @@ def generate_grand_average_plot(grand_avg_pupil: GrandAverage, grand_avg_rr: Gra
     axis[1, 0].set_ylabel('Estimaterd respiratory rate (breaths per minute)')
     
     for index, (level, pupil, rr) in enumerate(levels):
-        pupil_time = np.arange(len(pupil))
+        pupil_time = PREPROCESSING.pupil_times(len(pupil))
         
         (filtered_outlier_pupil, filtered_max , filtered_min) = normalized_outliers(pupil)
         
-        # apply savgol filter to smooth the pupil data in a window of 60 samples (which mean 60 seconds)
-        normalized_pupil = savgol_filter(filtered_outlier_pupil, 60, 1)
+        # apply savgol filter to smooth the pupil data in a window of 60 seconds
+        normalized_pupil = smoothed_pupil(filtered_outlier_pupil)
         
-        rr_time = list(map(lambda index: index * 5, range(len(rr))))
+        rr_time = PREPROCESSING.rr_times(len(rr))
         
         # # mapping the pupilData to IPA, `resampled_raw_pupil` contains each element for each second already
         # splited = split_list(filtered_outlier_pupil, 5)
@@ -923,7 +2557,7 @@ def generate_grand_average_plot(grand_avg_pupil: GrandAverage, grand_avg_rr: Gra
         axis[1, index].plot(rr_time, rr, label=f'respiratory rate', color='red')
         axis[1, index].set_ylim(0, 25)
         axis[1, index].set_title(level, size='large')
-        axis[1, index].set_xlabel('time (every 5s)')
+        axis[1, index].set_xlabel(f'time (every {PREPROCESSING.rrInterval:g}s)')
         
     # plt.suptitle('Grand Average', fontweight = 'bold', fontsize=18)
     
@@ -938,29 +2572,14 @@ def generate_grand_average_plot(grand_avg_pupil: GrandAverage, grand_avg_rr: Gra
     print(f'🙆🏻 plot saved at {plot}')
     
 # create box plots for the survey data in average
-def survey_box_plot(data: list[StorageData]):
+def survey_box_plot(index: StudyIndex):
+    import matplotlib.pyplot as plt
     print(f'🙆🏻 creating box plot for survey data')
     
     fig, axis = plt.subplots(1, 2, figsize=(14, 7))
     
-    all_experiment_data = list(map(lambda storageData: storageData.data, data))
-    
-    merged = [item for sublist in all_experiment_data for item in sublist]
-            
-    # easy
-    easy_data = list(filter(lambda stage: stage.level_as_number() == 1, merged))
-    easy_q1 = list(map(lambda stage: stage.surveyData.q1Answer, easy_data))
-    easy_q2 = list(map(lambda stage: stage.surveyData.q2Answer, easy_data))
-    
-    # normal
-    normal_data = list(filter(lambda stage: stage.level_as_number() == 2, merged))
-    normal_q1 = list(map(lambda stage: stage.surveyData.q1Answer, normal_data))
-    normal_q2 = list(map(lambda stage: stage.surveyData.q2Answer, normal_data))
-    
-    # hard
-    hard_data = list(filter(lambda stage: stage.level_as_number() == 3, merged))
-    hard_q1 = list(map(lambda stage: stage.surveyData.q1Answer, hard_data))
-    hard_q2 = list(map(lambda stage: stage.surveyData.q2Answer, hard_data))
+    (easy_q1, normal_q1, hard_q1) = index.by_level('difficulty')
+    (easy_q2, normal_q2, hard_q2) = index.by_level('stressful')
     
     axis[0].boxplot([np.array(easy_q1), np.array(normal_q1), np.array(hard_q1)])
     axis[0].set_ylabel('Difficulty rating (scale 1-5)')
@@ -983,26 +2602,13 @@ def survey_box_plot(data: list[StorageData]):
     print(f'🙆🏻 box plot saved at {plot}')
     
 # accuracy rate box plot
-def accuracy_box_plot(data: list[StorageData]):
+def accuracy_box_plot(index: StudyIndex):
+    import matplotlib.pyplot as plt
     print(f'🙆🏻 creating box plot for accuracy rate')
     
     fig, axis = plt.subplots()
     
-    all_experiment_data = list(map(lambda storageData: storageData.data, data))
-    
-    merged = [item for sublist in all_experiment_data for item in sublist]
-        
-    # easy
-    easy_data = list(filter(lambda stage: stage.level_as_number() == 1, merged))
-    easy_accuracy = list(map(lambda stage: stage.correctRate / 100, easy_data))
-    
-    # normal
-    normal_data = list(filter(lambda stage: stage.level_as_number() == 2, merged))
-    normal_accuracy = list(map(lambda stage: stage.correctRate / 100, normal_data))
-    
-    # hard
-    hard_data = list(filter(lambda stage: stage.level_as_number() == 3, merged))
-    hard_accuracy = list(map(lambda stage: stage.correctRate / 100, hard_data))
+    (easy_accuracy, normal_accuracy, hard_accuracy) = [rates / 100 for rates in index.by_level('correctRate')]
     
     axis.boxplot([np.array(easy_accuracy), np.array(normal_accuracy), np.array(hard_accuracy)])
     axis.set_ylabel('Accuracy rate (scale 0-1)')
@@ -1019,26 +2625,13 @@ def accuracy_box_plot(data: list[StorageData]):
     plt.close()
     print(f'🙆🏻 box plot saved at {plot}')
 
-def omission_box_plot(data: list[StorageData]):
+def omission_box_plot(index: StudyIndex):
+    import matplotlib.pyplot as plt
     print(f'🙆🏻 creating box plot for omission')
     
     fig, axis = plt.subplots()
     
-    all_experiment_data = list(map(lambda storageData: storageData.data, data))
-    
-    merged = [item for sublist in all_experiment_data for item in sublist]
-        
-    # easy
-    easy_data = list(filter(lambda stage: stage.level_as_number() == 1, merged))
-    easy_ommision = list(map(lambda stage: stage.omission(), easy_data))
-    
-    #normal
-    normal_data = list(filter(lambda stage: stage.level_as_number() == 2, merged))
-    normal_ommision = list(map(lambda stage: stage.omission(), normal_data))
-    
-    # hard
-    hard_data = list(filter(lambda stage: stage.level_as_number() == 3, merged))
-    hard_omission = list(map(lambda stage: stage.omission(), hard_data))
+    (easy_ommision, normal_ommision, hard_omission) = index.by_level('omission')
     
     axis.boxplot([np.array(easy_ommision), np.array(normal_ommision), np.array(hard_omission)])
     axis.set_ylabel('Number of ommision')
@@ -1056,27 +2649,14 @@ def omission_box_plot(data: list[StorageData]):
     print(f'🙆🏻 box plot saved at {plot}')
 
 # reaction time box plot
-def reaction_time_box_plot(data: list[StorageData]):
+def reaction_time_box_plot(index: StudyIndex):
+    import matplotlib.pyplot as plt
     
     print(f'🙆🏻 creating box plot for reaction')
     
     fig, axis = plt.subplots()
     
-    all_experiment_data = list(map(lambda storageData: storageData.data, data))
-    
-    merged = [item for sublist in all_experiment_data for item in sublist]
-    
-     # easy
-    easy_data = list(filter(lambda stage: stage.level_as_number() == 1, merged))
-    easy_reaction_time = list(map(lambda stage: stage.mean_reaction_time(), easy_data))
-    
-    # normal
-    normal_data = list(filter(lambda stage: stage.level_as_number() == 2, merged))
-    normal_reaction_time = list(map(lambda stage: stage.mean_reaction_time(), normal_data))
-    
-    # hard
-    hard_data = list(filter(lambda stage: stage.level_as_number() == 3, merged))
-    hard_reaction_time = list(map(lambda stage: stage.mean_reaction_time(), hard_data))
+    (easy_reaction_time, normal_reaction_time, hard_reaction_time) = index.by_level('reactionTime')
     
     axis.boxplot([np.array(easy_reaction_time), np.array(normal_reaction_time), np.array(hard_reaction_time)])
     axis.set_ylabel('reaction time (s)')
@@ -1093,56 +2673,302 @@ def reaction_time_box_plot(data: list[StorageData]):
     plt.close()
     print(f'🙆🏻 box plot saved at {plot}')
      
-# ------------------ main -----------------
+# ------------------ instrumentation -----------------
 
-data = readJsonFilesFromFolder(folderPath)
+# the highest resident memory of this process and of its finished worker processes (in bytes), None when it is not known
+def peak_memory():
+    if resource is None: return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * unit
 
-if data:
-    
-    # # analyze the median of the data from each candidate and save into csv file
-    analyze_median(data)
-    
-    # apply the configuration step on the data
-    for storageData in data: configure_storageData(storageData)
-    
-    # # analyze the median of the data from each candidate and save into csv file
-    # analyze_median(data)
-    
-    # # calculate the grand average of the pupil size and respiratory rate
-    grand_average_pupil_signal = grand_average_signal(ExperimentDataType.PUPIL, data)
-    grand_average_rr_signal = grand_average_signal(ExperimentDataType.RR, data)
-    
-    # # remove outliers from the grand average signal (respiratory rate)
-    grand_average_rr_signal.easy = normalized_outliers(grand_average_rr_signal.easy)[0]
-    grand_average_rr_signal.normal = normalized_outliers(grand_average_rr_signal.normal)[0]
-    grand_average_rr_signal.hard = normalized_outliers(grand_average_rr_signal.hard)[0]
-    
-    # # remove outliers from the grand average signal (pupil size)
-    grand_average_pupil_signal.easy = normalized_outliers(grand_average_pupil_signal.easy)[0]
-    grand_average_pupil_signal.normal = normalized_outliers(grand_average_pupil_signal.normal)[0]
-    grand_average_pupil_signal.hard = normalized_outliers(grand_average_pupil_signal.hard)[0]
-    
-    # # draw the individual plots
-    for storageData in data: generate_plot(storageData, grand_average_pupil_signal, grand_average_rr_signal)
-    
-    # # draw the grand average plot
-    # generate_grand_average_plot(grand_average_pupil_signal, grand_average_rr_signal)
-    
-    # # create the grand average table and boxplot
-    # grand_avg_box_plot([grand_average_pupil_signal, grand_average_rr_signal])
-    
-    # create the box plot for the survey data
-    survey_box_plot(data)
-    
-    # create the box plot for the accuracy rate
-    accuracy_box_plot(data)
+class RunReport:
+    """
+    Measures of a run, saved as JSON to compare runs on studies of different sizes.
     
-    # create the box plot for the omission
-    omission_box_plot(data)
+    - steps: the wall time, CPU time (of this process and of the worker processes) and peak memory after each step
+    - sessions: counters of each session file (samples, stages, stages dropped as corrupted and the ones dropped by the screening, 
+      and whether the session is excluded because none of its stages is left)
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.steps: dict[str, dict] = {}
+        self.sessions: dict[str, dict] = {}
+        self.details: dict = {}
+        self._wall = time.perf_counter()
+        self._cpu = os.times()
+    
+    @staticmethod
+    def cpu_times(start, end):
+        return (
+            (end.user + end.system) - (start.user + start.system),
+            (end.children_user + end.children_system) - (start.children_user + start.children_system)
+        )
     
-    # create the box plot for the reaction time
-    reaction_time_box_plot(data)
+    @contextmanager
+    def step(self, name: str):
+        wall, cpu = time.perf_counter(), os.times()
+        try:
+            yield
+        finally:
+            (ownCpu, workersCpu) = RunReport.cpu_times(cpu, os.times())
+            self.steps[name] = {
+                'wall': time.perf_counter() - wall,
+                'cpu': ownCpu,
+                'workersCpu': workersCpu,
+                'peakMemory': peak_memory()
+            }
+    
+    def count(self, session: str, **counters):
+        self.sessions.setdefault(session, {}).update(counters)
+    
+    def summary(self):
+        (ownCpu, workersCpu) = RunReport.cpu_times(self._cpu, os.times())
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'python': sys.version.split()[0],
+            'cpus': os.cpu_count(),
+            'parameters': preprocessing_parameters(),
+            **self.details,
+            'total': {
+                'wall': time.perf_counter() - self._wall,
+                'cpu': ownCpu,
+                'workersCpu': workersCpu,
+                'peakMemory': peak_memory()
+            },
+            'steps': self.steps,
+            'study': {
+                'sessions': len(self.sessions),
+                'stages': sum(session.get('stages', 0) for session in self.sessions.values()),
+                'samples': sum(session.get('samples', 0) for session in self.sessions.values()),
+                'dropped': sum(session.get('dropped', 0) for session in self.sessions.values()),
+                'screened': sum(session.get('screened', 0) for session in self.sessions.values()),
+                'excluded': sum(1 for session in self.sessions.values() if session.get('excluded', False))
+            },
+            'sessions': self.sessions
+        }
+    
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+    
+    def print(self):
+        summary = self.summary()
+        for (name, step) in summary['steps'].items():
+            print(f'🙆🏻 {name}: {step["wall"]:.2f}s wall, {step["cpu"]:.2f}s CPU ({step["workersCpu"]:.2f}s in workers)')
+        total = summary['total']
+        memory = f', {total["peakMemory"] / 2**20:.0f} MB peak memory' if total['peakMemory'] is not None else ''
+        print(f'🙆🏻 total: {total["wall"]:.2f}s wall, {total["cpu"]:.2f}s CPU ({total["workersCpu"]:.2f}s in workers){memory}')
+        study = summary['study']
+        print(f'🙆🏻 {study["sessions"]} sessions, {study["stages"]} stages, {study["samples"]} samples, {study["dropped"]} stages dropped ({study["screened"]} by the screening)')
+        if study['excluded']: print(f'🙆🏻 {study["excluded"]} session(s) excluded without any stage left')
+
+# ------------------ pipeline -----------------
+
+# the steps of the analysis and the steps they need, in the order they run
+# (the tables are made from the raw data, before the stages are configured)
+STEPS = {
+    'ingest': [],
+    'csv': ['ingest'],
+    'configure': ['ingest'],
+    'grand-average': ['configure'],
+    'plots': ['grand-average'],
+    'ipa': ['grand-average'],
+    'average-plots': ['grand-average'],
+    'boxplots': ['configure'],
+}
+
+# the outputs made when none is asked for
+DEFAULT_OUTPUTS = ['csv', 'plots', 'boxplots']
+
+def required_steps(outputs: list[str]):
+    """
+    The steps needed for the outputs, in the order they run.
+    """
+    needed = set()
+    pending = list(outputs)
+    while pending:
+        step = pending.pop()
+        if step in needed: continue
+        if step not in STEPS: raise ValueError(f'unknown step {step}, the steps are {", ".join(STEPS)}')
+        needed.add(step)
+        pending.extend(STEPS[step])
+    return [step for step in STEPS if step in needed]
+
+class Pipeline:
+    """
+    Analysis of a study folder, which only runs the steps needed for the requested outputs.
+    
+    - ingest: read the sessions (through the cache in `cacheDir`)
+    - csv: the individual tables
+    - configure: resample and filter the stages
+    - grand-average: the grand average pupil diameter and respiratory rate of each level
+    - plots: the individual plots (`ipa` draws them with a row for the IPA)
+    - average-plots: the grand average plot and box plot
+    - boxplots: the survey, accuracy, omission, reaction time and mean box plots
+    """
+    def __init__(self, path, cacheDir: str | None = None, workers: int | None = PLOT_WORKERS):
+        global folderPath
+        folderPath = path
+        self.path = path
+        self.cacheDir = cacheDir
+        self.workers = workers
+        self.report = RunReport()
+        self.data: list[StorageData] = []
+        self.grand_average_pupil: GrandAverage | None = None
+        self.grand_average_rr: GrandAverage | None = None
+        self.renderer: PlotRenderer | None = None
+        self.steps: list[str] = []
+    
+    def run(self, outputs: list[str] = DEFAULT_OUTPUTS):
+        self.steps = required_steps(outputs)
+        self.report.details.update({'folder': self.path, 'outputs': list(outputs), 'steps': self.steps, 'workers': self.workers})
+        for step in self.steps:
+            with self.report.step(step):
+                getattr(self, step.replace('-', '_'))()
+            # nothing to do without any session (or without any stage left after the configuration)
+            if step in ('ingest', 'configure') and not self.data: return
+        
+        # wait for the individual plots
+        if self.renderer is not None:
+            with self.report.step('render'):
+                self.renderer.wait()
+    
+    # the name of a session in the report
+    @staticmethod
+    def session_name(storageData: StorageData):
+        return os.path.basename(storageData.filePath) if storageData.filePath else storageData.userData.name
+    
+    def ingest(self):
+        # the outputs only use the serialData, the collected samples are only kept in the cache
+        self.data = readJsonFilesFromFolder(self.path, cacheDir=self.cacheDir, skip=('collectedData',)) or []
+        for storageData in self.data:
+            samples = sum(len(stage.serialData.pupilSizes) + len(stage.serialData.respiratoryRates) for stage in storageData.data)
+            self.report.count(
+                Pipeline.session_name(storageData), 
+                name=storageData.userData.name, stages=len(storageData.data), samples=samples, dropped=0, screened=0, excluded=False
+            )
     
-    #create the mean box plot of respiratory rate and pupil size
-    mean_box_plot_rr(data)
-    mean_box_plot_pupil(data)
\ No newline at end of file
+    def csv(self):
+        # analyze the median of the data from each candidate and save into csv file
+        analyze_median(self.data)
+    
+    def configure(self):
+        # apply the configuration step on the data, every stage of the study at once
+        sessions = [(storageData, len(storageData.data)) for storageData in self.data]
+        quality = configure_storagesData(self.data, self.cacheDir)
+        write_quality_report(quality)
+        # the stages failing the screening or with the same value in the whole configured data are dropped as corrupted,
+        # the sessions without any stage left are excluded from the next steps
+        excluded = set(quality.excluded)
+        for (storageData, count) in sessions:
+            session = Pipeline.session_name(storageData)
+            self.report.count(session, dropped=count - len(storageData.data), screened=quality.dropped(session), excluded=session in excluded)
+    
+    def grand_average(self):
+        # calculate the grand average of the pupil size and respiratory rate, without the outliers
+        self.grand_average_pupil = grand_average_signal(ExperimentDataType.PUPIL, self.data)
+        self.grand_average_rr = grand_average_signal(ExperimentDataType.RR, self.data)
+        self.grand_average_rr.remove_outliers()
+        self.grand_average_pupil.remove_outliers()
+    
+    def plots(self):
+        # the individual plots are drawn once, with the IPA when it is asked for
+        if self.renderer is not None: return
+        # they are drawn in other processes while the aggregate plots are made
+        self.renderer = PlotRenderer(self.workers)
+        show_ipa = 'ipa' in self.steps
+        for storageData in self.data:
+            self.renderer.submit(storageData, self.grand_average_pupil, self.grand_average_rr, show_ipa=show_ipa)
+    
+    def ipa(self):
+        self.plots()
+    
+    def average_plots(self):
+        # draw the grand average plot, the grand average table and boxplot
+        generate_grand_average_plot(self.grand_average_pupil, self.grand_average_rr)
+        grand_avg_box_plot([self.grand_average_pupil, self.grand_average_rr])
+    
+    def boxplots(self):
+        # index the configured stages once for the aggregate plots
+        index = StudyIndex(self.data)
+        survey_box_plot(index)
+        accuracy_box_plot(index)
+        omission_box_plot(index)
+        reaction_time_box_plot(index)
+        mean_box_plot_rr(index)
+        mean_box_plot_pupil(index)
+
+def replay_folder(path):
+    """
+    Replay the recorded sessions of a folder through the live processor.
+    """
+    for storageData in streamJsonFilesFromFolder(path, workers=1):
+        print(f'🙆🏻 replaying the session of {storageData.userData.name}')
+        for (stage, metrics) in replay_session(storageData):
+            flags = ' pupil outlier' if metrics.pupilOutlier else ''
+            flags += ' respiratory rate outlier' if metrics.respiratoryRateOutlier else ''
+            ripa = 'n/a' if metrics.ripa is None else f'{metrics.ripa:.2f}'
+            ipa = 'n/a' if metrics.ipa is None else f'{metrics.ipa:.3f}'
+            print(f'{stage.level_as_n_back()}: pupil {metrics.pupilSize:.2f} mm, RIPA {ripa}, IPA {ipa}{flags}')
+
+def parse_arguments(arguments = None):
+    parser = argparse.ArgumentParser(description='Analyze the sessions of a BreathActivity study folder.')
+    parser.add_argument('folder', help='folder with the session files, the outputs are written in it')
+    parser.add_argument('outputs', nargs='*', metavar='output',
+                        help=f'steps to run, with the steps they need ({", ".join(STEPS)}), default: {" ".join(DEFAULT_OUTPUTS)}')
+    parser.add_argument('--ipa', action='store_true', help='add the IPA to the individual plots (same as the ipa output)')
+    parser.add_argument('--incremental', action='store_true', help='only update the outputs of the new or changed sessions')
+    parser.add_argument('--replay', action='store_true', help='replay the sessions through the live processor')
+    parser.add_argument('--workers', type=int, default=PLOT_WORKERS, help='processes drawing the individual plots (1 draws them in this process)')
+    parser.add_argument('--no-cache', action='store_true', help='read the session files without the cache')
+    parser.add_argument('--duration', type=float, default=PREPROCESSING.duration, help='seconds of data in each stage')
+    parser.add_argument('--pupil-rate', type=float, default=PREPROCESSING.pupilRate, help='pupil sizes per second after the configuration')
+    parser.add_argument('--respiratory-rate', type=float, default=PREPROCESSING.respiratoryRate, help='respiratory rates per second after the configuration')
+    parser.add_argument('--max-dropout', type=float, default=PREPROCESSING.maxDropout, help='drop the stages with a larger fraction of missing or zero pupil sizes')
+    parser.add_argument('--max-clipped', type=float, default=PREPROCESSING.maxClipped, help='drop the stages with a larger fraction of pupil sizes outside the MAD bounds')
+    parser.add_argument('--min-length', type=float, default=PREPROCESSING.minLength, help='drop the stages with fewer samples (fraction of the median number of samples)')
+    parser.add_argument('--blink-fill', choices=['linear', 'cubic', 'none'], default=PREPROCESSING.blinkFill, help='how the blinks and dropouts of the pupil sizes are filled')
+    parser.add_argument('--report', help='file of the JSON run report (default: .run_report.json in the folder)')
+    parser.add_argument('--profile', help='save the cProfile statistics of the run in this file (the plots drawn by workers are not profiled)')
+    parsed = parser.parse_intermixed_args(arguments)
+    for output in parsed.outputs:
+        if output not in STEPS: parser.error(f'unknown output {output}, choose from {", ".join(STEPS)}')
+    # a configured stage needs two pupil sizes and two respiratory rates, a single sample is dropped as a constant signal
+    if round(parsed.duration * parsed.pupil_rate) < 2 or round(parsed.duration * parsed.respiratory_rate) < 2:
+        parser.error('the duration is too short for the pupil and respiratory rates, a stage needs at least two configured samples of each')
+    return parsed
+
+# ------------------ main -----------------
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    folderPath = arguments.folder
+    PREPROCESSING = replace(
+        PREPROCESSING, duration=arguments.duration, pupilRate=arguments.pupil_rate, respiratoryRate=arguments.respiratory_rate,
+        maxDropout=arguments.max_dropout, maxClipped=arguments.max_clipped, minLength=arguments.min_length, blinkFill=arguments.blink_fill
+    )
+    cacheDir = None if arguments.no_cache else os.path.join(folderPath, '.cache')
+    
+    if arguments.replay:
+        replay_folder(folderPath)
+    elif arguments.incremental:
+        # only update the outputs of the new or changed sessions
+        analyze_incremental(folderPath, cacheDir, workers=arguments.workers, show_ipa=arguments.ipa or 'ipa' in arguments.outputs)
+    else:
+        outputs = arguments.outputs or list(DEFAULT_OUTPUTS)
+        if arguments.ipa: outputs.append('ipa')
+        pipeline = Pipeline(folderPath, cacheDir=cacheDir, workers=arguments.workers)
+        
+        if arguments.profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(pipeline.run, outputs)
+            profiler.dump_stats(arguments.profile)
+            pipeline.report.details['profile'] = arguments.profile
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        else:
+            pipeline.run(outputs)
+        
+        # the report is a hidden file, so it is not read as a session
+        pipeline.report.save(arguments.report or os.path.join(folderPath, '.run_report.json'))
+        pipeline.report.print()